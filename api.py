@@ -0,0 +1,262 @@
+import os
+
+# Workers memory-map the published index so they share one copy in the page cache
+os.environ.setdefault("INDEX_MMAP", "1")
+
+import json
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from app.agent import load_agent
+from app.embeddings import get_embeddings
+from app.index_store import IndexStore
+from app.indexing_jobs import get_indexing_service
+from app.llm import get_groq_api_key
+from app.singleflight import SingleFlight
+from app.upload_store import UploadStore
+from app.tenants import DEFAULT_TENANT, normalize_tenant_id, tenant_dir, tenant_data_dir, tenant_vector_store_path
+
+load_dotenv()
+
+# Service settings, read by every worker process
+SERVICE_HOST = os.getenv("SERVICE_HOST", "0.0.0.0")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8000"))
+SERVICE_WORKERS = int(os.getenv("SERVICE_WORKERS", "2"))
+SERVICE_MODEL = os.getenv("SERVICE_MODEL", "llama3-70b-8192")
+
+# Backpressure, per worker: LLM calls running at once, and requests allowed to wait for a slot
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "8"))
+MAX_QUEUED_REQUESTS = int(os.getenv("MAX_QUEUED_REQUESTS", "32"))
+RETRY_AFTER_SECONDS = 2
+
+
+class AskRequest(BaseModel):
+    query: str
+    tenant: str = DEFAULT_TENANT
+
+
+class LLMQueue:
+    """
+    Bounded admission to the LLM. Up to `concurrency` calls run at once and
+    up to `max_waiting` more wait for a slot; anything beyond that is
+    rejected immediately with 429 instead of piling up behind a saturated LLM.
+    """
+
+    def __init__(self, concurrency=MAX_CONCURRENT_LLM_CALLS, max_waiting=MAX_QUEUED_REQUESTS):
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def saturated(self):
+        return self.waiting >= self.max_waiting
+
+    async def acquire(self):
+        if self.active >= self.concurrency and self.saturated():
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail="LLM queue is full, retry later",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+            )
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "concurrency": self.concurrency,
+            "max_waiting": self.max_waiting
+        }
+
+
+_agents = {}
+_agents_lock = threading.Lock()
+# One cold load per (tenant, version); other tenants are not blocked by it
+_agent_loads = SingleFlight()
+
+
+def get_tenant_agent(tenant):
+    """
+    Agent for a tenant's published index, reloaded when a new version is published
+
+    Raises:
+        HTTPException: 404 if the tenant has no index yet
+    """
+    vector_store_path = tenant_vector_store_path(tenant)
+    version = IndexStore(vector_store_path).current_version()
+    if version is None:
+        raise HTTPException(status_code=404, detail=f"No index for tenant '{tenant}'. POST PDFs to /ingest first.")
+
+    with _agents_lock:
+        loaded = _agents.get(tenant)
+    if loaded and loaded[0] == version:
+        return loaded[1]
+
+    def load():
+        agent = load_agent(vector_store_path, model_name=SERVICE_MODEL)
+        with _agents_lock:
+            _agents[tenant] = (version, agent)
+        return agent
+
+    agent, _ = _agent_loads.do((tenant, version), load)
+    return agent
+
+
+def _sources(documents):
+    return [
+        {
+            "source": doc.metadata.get("source_file") or doc.metadata.get("source"),
+            "page": doc.metadata.get("page"),
+            "content": doc.page_content
+        }
+        for doc in documents
+    ]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load the embedding model once per worker, before the first request
+    await run_in_threadpool(get_embeddings)
+    app.state.llm_queue = LLMQueue()
+    try:
+        get_groq_api_key()
+        app.state.ready = True
+        print(f"✅ Worker {os.getpid()} ready")
+    except ValueError as e:
+        app.state.ready = False
+        print(f"❌ Worker {os.getpid()} not ready: {e}")
+    yield
+
+
+app = FastAPI(title="Insurance RAG Agent", lifespan=lifespan)
+
+
+@app.get("/health/live")
+def live():
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def ready():
+    llm_queue = app.state.llm_queue
+    if not app.state.ready:
+        raise HTTPException(status_code=503, detail="LLM credentials missing")
+    if llm_queue.saturated():
+        raise HTTPException(status_code=503, detail="LLM queue saturated")
+    return {"status": "ready", "pid": os.getpid(), "llm_queue": llm_queue.stats()}
+
+
+@app.post("/ask")
+async def ask(request: AskRequest):
+    tenant = normalize_tenant_id(request.tenant)
+    agent = await run_in_threadpool(get_tenant_agent, tenant)
+
+    llm_queue = app.state.llm_queue
+    await llm_queue.acquire()
+    try:
+        response = await run_in_threadpool(agent.invoke, {"query": request.query})
+    finally:
+        llm_queue.release()
+
+    return {
+        "query": request.query,
+        "tenant": tenant,
+        "answer": response["result"],
+        "sources": _sources(response.get("source_documents") or []),
+        "precomputed": response.get("precomputed", False)
+    }
+
+
+@app.post("/ask/stream")
+async def ask_stream(request: AskRequest):
+    """Server-sent events: one 'sources' event, 'token' events, then 'done'"""
+    tenant = normalize_tenant_id(request.tenant)
+    agent = await run_in_threadpool(get_tenant_agent, tenant)
+
+    llm_queue = app.state.llm_queue
+    await llm_queue.acquire()
+    try:
+        documents, tokens = await run_in_threadpool(agent.stream, request.query)
+    except Exception:
+        llm_queue.release()
+        raise
+
+    async def events():
+        try:
+            yield f"event: sources\ndata: {json.dumps(_sources(documents))}\n\n"
+            async for token in iterate_in_threadpool(tokens):
+                yield f"event: token\ndata: {json.dumps(token)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+        finally:
+            llm_queue.release()
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/ingest", status_code=202)
+async def ingest(files: list[UploadFile] = File(...), tenant: str = Form(DEFAULT_TENANT)):
+    """
+    Store PDFs for a tenant and queue a rebuild of its index over all its PDFs
+    """
+    tenant = normalize_tenant_id(tenant)
+    upload_store = UploadStore(tenant_dir(tenant), tenant_data_dir(tenant))
+
+    stored = []
+    for upload in files:
+        name = os.path.basename(upload.filename or "")
+        if not name.lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail=f"Not a PDF: {upload.filename}")
+        content = await upload.read()
+        stored.append(await run_in_threadpool(upload_store.save, name, content))
+
+    # The PDF list is read when the build starts, under the tenant's build lock,
+    # so a build queued on another worker cannot publish without these uploads
+    def pdf_paths():
+        return [record["path"] for record in upload_store.list()]
+
+    job_id = get_indexing_service().submit(pdf_paths, tenant_vector_store_path(tenant))
+    return {
+        "job_id": job_id,
+        "tenant": tenant,
+        "stored": [{"name": r["name"], "hash": r["hash"], "duplicate_of": r["duplicate_of"]} for r in stored]
+    }
+
+
+@app.get("/ingest/{job_id}")
+def ingest_status(job_id: str):
+    # Job status is persisted under the shared jobs directory, so any worker can answer
+    job = get_indexing_service().status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+def main():
+    import uvicorn
+
+    print(f"🚀 Starting query service on {SERVICE_HOST}:{SERVICE_PORT} with {SERVICE_WORKERS} worker(s)")
+    uvicorn.run("api:app", host=SERVICE_HOST, port=SERVICE_PORT, workers=SERVICE_WORKERS)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,78 +1,77 @@
-import os
-import streamlit as st
+import weakref
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.chains import RetrievalQA
+from app.llm import get_groq_llm
+from app.index_store import IndexStore
+from app.qa import QAAgent, index_version
+from app.tenants import get_index_cache
+from app.retrieval import ADAPTIVE_MAX_K, ADAPTIVE_MIN_K, build_retriever
+from app.quantization import load_full_vectors
+from app.prompting import build_qa_chain
+from app.router import ANSWER_MODES, get_query_router
+from app.relevance import get_relevance_gate
 
 load_dotenv()
 
-def load_agent(vector_store_path="vectorstore", model_name="llama3-70b-8192"):
+def load_agent(vector_store_path="vectorstore", model_name="llama3-70b-8192", search_type="adaptive", fetch_k=20, mmr_lambda=0.5, answer_mode="auto", min_k=ADAPTIVE_MIN_K, max_k=ADAPTIVE_MAX_K):
     """
     Load agent with enhanced error handling and deployment compatibility
     
     Args:
         vector_store_path: Path to the vector store
         model_name: Name of the Groq model to use
+        search_type: 'adaptive' (k follows the retrieval scores), 'similarity' (top-k) or 'mmr' (diversity-aware top-k)
+        fetch_k: Candidates considered by MMR
+        mmr_lambda: MMR trade-off, 1.0 = pure relevance, 0.0 = pure diversity
+        answer_mode: 'auto' (lookups answered extractively without the LLM) or 'llm'
+        min_k: Fewest chunks adaptive retrieval sends to the LLM
+        max_k: Most chunks adaptive retrieval sends to the LLM
     """
     
     try:
-        # Load embeddings and vectorstore
-        print(f"🔍 Loading embeddings and vectorstore from: {vector_store_path}")
-        embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
+        if answer_mode not in ANSWER_MODES:
+            raise ValueError(f"Unsupported answer_mode: {answer_mode}. Use one of {ANSWER_MODES}")
         
-        if not os.path.exists(vector_store_path):
+        # Load vectorstore through the shared index cache (one copy per version per process)
+        print(f"🔍 Loading vectorstore from: {vector_store_path}")
+        store = IndexStore(vector_store_path)
+        if not store.exists():
             raise ValueError(f"Vector store not found at: {vector_store_path}")
         
-        db = FAISS.load_local(
-            vector_store_path, 
-            embeddings, 
-            allow_dangerous_deserialization=True
-        )
-        retriever = db.as_retriever(search_kwargs={"k": 5})
-        print("✅ Vector store loaded successfully")
-        
-        # Get API key - try Streamlit secrets first, then environment
-        groq_api_key = None
+        # Hold a lease on the published version so it is not garbage collected
+        # while this agent (or another session) still reads from it
+        lease = store.acquire()
         try:
-            # For Streamlit Cloud deployment
-            groq_api_key = st.secrets["GROQ_API_KEY"]
-            print("✅ API key loaded from Streamlit secrets")
-        except:
-            # For local development
-            groq_api_key = os.getenv("GROQ_API_KEY")
-            print("✅ API key loaded from environment variables")
-        
-        if not groq_api_key:
-            raise ValueError(
-                "GROQ_API_KEY not found. Please add it to Streamlit secrets or environment variables.\n"
-                "Get your API key from: https://console.groq.com/"
+            version = lease.version if lease.version != "legacy" else index_version(lease.path)
+            db = get_index_cache().get(lease.path, version)
+            retriever = build_retriever(
+                db,
+                search_type,
+                k=5,
+                fetch_k=fetch_k,
+                mmr_lambda=mmr_lambda,
+                full_vectors=load_full_vectors(lease.path),
+                min_k=min_k,
+                max_k=max_k
             )
+            print(f"✅ Vector store loaded successfully (version {lease.version})")
         
-        # Initialize Groq LLM
-        print(f"🔍 Initializing Groq model: {model_name}")
-        llm = ChatGroq(
-            api_key=groq_api_key,
-            model_name=model_name,
-            temperature=0.1,
-            max_tokens=1000
-        )
-        print("✅ Groq model initialized successfully")
+            # Shared Groq client
+            llm = get_groq_llm(model_name)
         
-        # Create QA chain
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
-            return_source_documents=True,
-            verbose=True
-        )
+            # Create QA chain with the insurance prompt and a stable prompt prefix
+            qa_chain = build_qa_chain(llm, retriever, verbose=True)
         
-        print("✅ QA chain created successfully")
-        return qa_chain
+            print("✅ QA chain created successfully")
+            router = get_query_router() if answer_mode == "auto" else None
+            agent = QAAgent(qa_chain, version, model_name, lease.path, llm=llm, router=router,
+                        relevance_gate=get_relevance_gate(),
+                        config=(search_type, 5, fetch_k, mmr_lambda, min_k, max_k, answer_mode))
+        except Exception:
+            # Released here, or the version is never collected for the life of the process
+            lease.release()
+            raise
+        weakref.finalize(agent, lease.release)
+        return agent
         
     except Exception as e:
         print(f"❌ Error in load_agent: {str(e)}")
@@ -0,0 +1,232 @@
+"""
+Export a published index version as one compressed, checksummed bundle, and
+import it on another node without re-extracting or re-embedding anything.
+
+    python -m app.bundles export --vector-store vectorstore index.tar.gz
+    python -m app.bundles import --vector-store vectorstore index.tar.gz
+"""
+import os
+import io
+import gzip
+import json
+import time
+import hashlib
+import tarfile
+import argparse
+from app.index_store import IndexStore
+
+BUNDLE_FORMAT = 1
+MANIFEST_FILE = "manifest.json"
+
+# Manifest of the imported bundle, kept in the version directory
+BUNDLE_MANIFEST_FILE = "bundle_manifest.json"
+
+# Bytes read/written per step while streaming, and gzip level (vectors barely compress)
+STREAM_BLOCK_SIZE = 1024 * 1024
+COMPRESS_LEVEL = 6
+
+
+class _HashingReader:
+    """File-like wrapper hashing and counting what passes through read()"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.digest.update(data)
+        self.size += len(data)
+        return data
+
+
+def _index_info(directory):
+    import faiss
+    from app.tenants import mmap_read_flags
+
+    index = faiss.read_index(os.path.join(directory, "index.faiss"), mmap_read_flags())
+    return {"dimension": index.d, "ntotal": index.ntotal, "index_type": type(index).__name__}
+
+
+def _version_files(directory):
+    names = []
+    for dirpath, _, filenames in os.walk(directory):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            names.append(os.path.relpath(path, directory).replace(os.sep, "/"))
+    return sorted(names)
+
+
+def export_bundle(vector_store_path, bundle_path):
+    """
+    Stream the current index version into a gzip-compressed tar bundle
+
+    Files are hashed while they are written; the manifest (embedding model,
+    index shape and per-file sha256) is the last member.
+
+    Returns:
+        The manifest
+    """
+    from app.embeddings import EMBEDDING_MODEL
+
+    with IndexStore(vector_store_path).acquire() as lease:
+        manifest = {
+            "format": BUNDLE_FORMAT,
+            "source_version": lease.version,
+            "embedding_model": EMBEDDING_MODEL,
+            "created": time.time(),
+            **_index_info(lease.path),
+            "files": {}
+        }
+
+        tmp_path = f"{bundle_path}.tmp-{os.getpid()}"
+        with open(tmp_path, "wb") as raw, \
+                gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=COMPRESS_LEVEL) as compressed, \
+                tarfile.open(fileobj=compressed, mode="w|") as tar:
+            for name in _version_files(lease.path):
+                path = os.path.join(lease.path, name)
+                info = tar.gettarinfo(path, arcname=name)
+                with open(path, "rb") as f:
+                    hashing = _HashingReader(f)
+                    tar.addfile(info, hashing)
+                manifest["files"][name] = {"sha256": hashing.digest.hexdigest(), "size": hashing.size}
+
+            data = json.dumps(manifest, indent=1).encode("utf-8")
+            info = tarfile.TarInfo(MANIFEST_FILE)
+            info.size = len(data)
+            info.mtime = int(manifest["created"])
+            tar.addfile(info, io.BytesIO(data))
+        os.replace(tmp_path, bundle_path)
+
+    total = sum(entry["size"] for entry in manifest["files"].values())
+    print(f"📦 Exported index version {manifest['source_version']} ({manifest['ntotal']} vectors, "
+          f"{total / 1024 / 1024:.1f} MB -> {os.path.getsize(bundle_path) / 1024 / 1024:.1f} MB): {bundle_path}")
+    return manifest
+
+
+def _safe_member_name(name):
+    normalized = os.path.normpath(name)
+    if os.path.isabs(normalized) or normalized.startswith("..") or normalized == ".":
+        raise ValueError(f"Unsafe path in bundle: {name}")
+    return normalized
+
+
+def _rewrite_index_version(directory, version):
+    """
+    Point version-stamped artifacts (summary tree, precomputed answers) at the
+    version the bundle is published as, so the importing node does not
+    discard them as stale
+    """
+    from app.summarizer import SUMMARY_TREE_FILE
+    from app.precompute import PRECOMPUTED_DIR
+
+    paths = [os.path.join(directory, SUMMARY_TREE_FILE)]
+    precomputed_dir = os.path.join(directory, PRECOMPUTED_DIR)
+    if os.path.isdir(precomputed_dir):
+        paths += [os.path.join(precomputed_dir, name) for name in sorted(os.listdir(precomputed_dir)) if name.endswith(".json")]
+
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if "index_version" not in data:
+            continue
+        data["index_version"] = version
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+
+def import_bundle(bundle_path, vector_store_path="vectorstore", allow_model_mismatch=False):
+    """
+    Verify a bundle and publish it as a new version of the index store
+
+    The bundle is streamed straight into a staging version directory (no
+    re-encoding, so index.faiss and vectors.f32.npy are memory-mappable as
+    written), checked against the manifest, and published atomically. The
+    summary tree and precomputed answers are re-stamped with the new version.
+
+    Raises:
+        ValueError: On a checksum, size or file list mismatch, an unsafe or
+            unexpected member, or an embedding model different from this node's
+    """
+    from app.embeddings import EMBEDDING_MODEL
+
+    store = IndexStore(vector_store_path)
+    staged = store.begin_version()
+    try:
+        received = {}
+        manifest = None
+        with tarfile.open(bundle_path, mode="r|gz") as tar:
+            for member in tar:
+                if not member.isfile():
+                    raise ValueError(f"Unexpected member type in bundle: {member.name}")
+                source = tar.extractfile(member)
+                if member.name == MANIFEST_FILE:
+                    manifest = json.loads(source.read().decode("utf-8"))
+                    continue
+
+                name = _safe_member_name(member.name)
+                path = os.path.join(staged.path, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                digest = hashlib.sha256()
+                size = 0
+                with open(path, "wb") as f:
+                    for block in iter(lambda: source.read(STREAM_BLOCK_SIZE), b""):
+                        digest.update(block)
+                        size += len(block)
+                        f.write(block)
+                received[name.replace(os.sep, "/")] = {"sha256": digest.hexdigest(), "size": size}
+
+        if manifest is None:
+            raise ValueError("Bundle has no manifest")
+        if manifest.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"Unsupported bundle format: {manifest.get('format')}")
+        if manifest["embedding_model"] != EMBEDDING_MODEL and not allow_model_mismatch:
+            raise ValueError(
+                f"Bundle was embedded with {manifest['embedding_model']}, this node uses {EMBEDDING_MODEL}"
+            )
+        missing = set(manifest["files"]) - set(received)
+        unexpected = set(received) - set(manifest["files"])
+        if missing or unexpected:
+            raise ValueError(f"Bundle file list mismatch: missing {sorted(missing)}, unexpected {sorted(unexpected)}")
+        for name, expected in manifest["files"].items():
+            if received[name] != expected:
+                raise ValueError(f"Checksum mismatch for {name}: bundle is corrupt")
+
+        info = _index_info(staged.path)
+        if info["ntotal"] != manifest["ntotal"] or info["dimension"] != manifest["dimension"]:
+            raise ValueError(f"Index shape {info} does not match manifest")
+
+        # Checksums cover the files as exported; the version stamps are rewritten after verification
+        _rewrite_index_version(staged.path, staged.version)
+        with open(os.path.join(staged.path, BUNDLE_MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        store.publish(staged)
+    except Exception:
+        store.abort(staged)
+        raise
+
+    print(f"📦 Imported index version {manifest['source_version']} as {staged.version} "
+          f"({manifest['ntotal']} vectors, {len(received)} files verified)")
+    return staged.version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export or import checksummed index bundles")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("bundle", help="Bundle file (.tar.gz)")
+    parser.add_argument("--vector-store", default="vectorstore", help="Index store root")
+    parser.add_argument("--allow-model-mismatch", action="store_true",
+                        help="Import even if the bundle used a different embedding model")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        export_bundle(args.vector_store, args.bundle)
+    else:
+        import_bundle(args.bundle, args.vector_store, allow_model_mismatch=args.allow_model_mismatch)
+
+
+if __name__ == "__main__":
+    main()
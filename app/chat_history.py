@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import weakref
+from array import array
+
+CHAT_ARCHIVE_DIR = os.path.join(".cache", "chat_archive")
+
+# Messages kept in session state; older ones live only in the on-disk archive
+RECENT_WINDOW = 20
+
+# Archives untouched for this long belong to ended sessions and are deleted
+ARCHIVE_MAX_AGE_SECONDS = 24 * 3600
+
+
+def prune_archives(archive_dir=CHAT_ARCHIVE_DIR, max_age=ARCHIVE_MAX_AGE_SECONDS):
+    """
+    Delete chat archives not written to within max_age seconds
+
+    Returns:
+        Number of archives deleted
+    """
+    try:
+        names = os.listdir(archive_dir)
+    except OSError:
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for name in names:
+        path = os.path.join(archive_dir, name)
+        try:
+            if name.endswith(".jsonl") and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    if removed:
+        print(f"🧹 Pruned {removed} old chat archive(s)")
+    return removed
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ChatHistory:
+    """
+    Bounded chat message store for one session.
+
+    The newest messages are kept in memory; older ones are appended to a
+    JSONL archive on disk with their byte offsets, so any page of history can
+    be read with one seek and rendering cost does not grow with the session.
+    The archive is deleted on clear() and when the history is garbage
+    collected with its session; prune_archives() catches what is left behind.
+    """
+
+    def __init__(self, archive_path, window=RECENT_WINDOW):
+        self.archive_path = archive_path
+        self.window = window
+        self.recent = []
+        self._offsets = array("q")
+        weakref.finalize(self, _remove_file, archive_path)
+
+    def __len__(self):
+        return len(self._offsets) + len(self.recent)
+
+    def append(self, role, message):
+        self.recent.append((role, message))
+        if len(self.recent) > self.window:
+            self._archive(self.recent[:-self.window])
+            self.recent = self.recent[-self.window:]
+
+    def _archive(self, messages):
+        os.makedirs(os.path.dirname(self.archive_path), exist_ok=True)
+        with open(self.archive_path, "ab") as f:
+            for role, message in messages:
+                self._offsets.append(f.tell())
+                f.write(json.dumps([role, message]).encode("utf-8") + b"\n")
+
+    def _read_archived(self, start, end):
+        """Archived messages [start, end) in chronological order"""
+        if start >= end:
+            return []
+        messages = []
+        try:
+            with open(self.archive_path, "rb") as f:
+                f.seek(self._offsets[start])
+                for _ in range(end - start):
+                    role, message = json.loads(f.readline())
+                    messages.append((role, message))
+        except FileNotFoundError:
+            # Pruned while the session was idle; older messages are gone
+            self._offsets = array("q")
+            return []
+        return messages
+
+    def page_count(self, page_size):
+        return max(1, -(-len(self) // page_size))
+
+    def page(self, page_number, page_size):
+        """
+        Messages of one page, newest first; page 0 holds the newest messages
+        """
+        total = len(self)
+        end = max(total - page_number * page_size, 0)
+        start = max(end - page_size, 0)
+
+        archived_count = len(self._offsets)
+        messages = self._read_archived(min(start, archived_count), min(end, archived_count))
+        messages += self.recent[max(start - archived_count, 0):max(end - archived_count, 0)]
+        return list(reversed(messages))
+
+    def clear(self):
+        self.recent = []
+        self._offsets = array("q")
+        _remove_file(self.archive_path)
@@ -0,0 +1,141 @@
+import re
+import numpy as np
+
+# Raw turns kept verbatim; older turns are folded into the running summary
+MAX_RECENT_TURNS = 3
+SUMMARY_TOKEN_CAP = 300
+
+# Cosine similarity between consecutive standalone questions above which the
+# previous turn's retrieved chunks are reused instead of retrieving again
+CONTEXT_REUSE_THRESHOLD = 0.8
+
+_FOLLOW_UP_PATTERN = re.compile(
+    r"^(and|but|also|what about|how about|same|then)\b|\b(it|its|this|that|these|those|they|them|their|above|previous)\b",
+    re.IGNORECASE
+)
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def _cap_tokens(text, cap):
+    return text if estimate_tokens(text) <= cap else text[:cap * 4].rsplit(" ", 1)[0] + " ..."
+
+
+def _llm_text(response):
+    return getattr(response, "content", response).strip()
+
+
+def looks_like_follow_up(question):
+    """
+    True for referential questions (pronouns, "what about ...") that need the
+    conversation to make sense. Short self-contained questions such as
+    "What is the grace period?" are not condensed.
+    """
+    return bool(_FOLLOW_UP_PATTERN.search(question))
+
+
+class ConversationMemory:
+    """
+    Bounded chat memory for one session: the last few turns verbatim plus a
+    token-capped summary of everything older, and the previous turn's
+    retrieved chunks for reuse by follow-up questions. Turns pushed out of the
+    recent window are folded into the summary lazily, only when a follow-up
+    actually needs the history.
+    """
+
+    def __init__(self, max_recent_turns=MAX_RECENT_TURNS, summary_token_cap=SUMMARY_TOKEN_CAP):
+        self.max_recent_turns = max_recent_turns
+        self.summary_token_cap = summary_token_cap
+        self.summary = ""
+        self.recent = []
+        self._unfolded = []
+        self.last_question_vector = None
+        self.last_documents = []
+        # (index path, index version) the last_documents were retrieved from
+        self.last_index = None
+
+    def is_empty(self):
+        return not self.summary and not self.recent and not self._unfolded
+
+    def history_text(self):
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of earlier conversation: {self.summary}")
+        for question, answer in self.recent:
+            parts.append(f"User: {question}\nAssistant: {answer}")
+        return "\n".join(parts)
+
+    def add_turn(self, question, answer):
+        """Record a turn; turns over the limit wait to be folded into the summary"""
+        self.recent.append((question, _cap_tokens(answer, self.summary_token_cap)))
+        while len(self.recent) > self.max_recent_turns:
+            self._unfolded.append(self.recent.pop(0))
+
+    def fold(self, llm):
+        """Fold turns that left the recent window into the summary (one LLM call per turn)"""
+        while self._unfolded:
+            old_question, old_answer = self._unfolded.pop(0)
+            self.summary = self._fold(llm, old_question, old_answer)
+
+    def _fold(self, llm, question, answer):
+        prompt = (
+            f"Update the running summary of an insurance Q&A conversation in at most "
+            f"{self.summary_token_cap * 3 // 4} words. Keep product names, ages, amounts and conditions.\n\n"
+            f"Current summary: {self.summary or '(empty)'}\n\nNew turn:\nUser: {question}\nAssistant: {answer}\n\n"
+            "Updated summary:"
+        )
+        try:
+            summary = _llm_text(llm.invoke(prompt))
+        except Exception as e:
+            print(f"⚠️ Could not update conversation summary: {e}")
+            summary = f"{self.summary} User asked: {question}".strip()
+        return _cap_tokens(summary, self.summary_token_cap)
+
+    def clear(self):
+        self.summary = ""
+        self.recent = []
+        self._unfolded = []
+        self.last_question_vector = None
+        self.last_documents = []
+        self.last_index = None
+
+
+def condense_question(llm, memory, question):
+    """
+    Rewrite a follow-up into a standalone question using the conversation.
+    Self-contained questions are returned unchanged without an LLM call.
+    """
+    if memory.is_empty() or not looks_like_follow_up(question):
+        return question
+
+    memory.fold(llm)
+    prompt = (
+        "Rewrite the follow-up question as a single standalone question about the insurance documents, "
+        "using the conversation for context. Return only the question.\n\n"
+        f"{memory.history_text()}\n\nFollow-up question: {question}\nStandalone question:"
+    )
+    try:
+        standalone = _llm_text(llm.invoke(prompt)).strip('"')
+    except Exception as e:
+        print(f"⚠️ Could not condense follow-up question: {e}")
+        return question
+    print(f"🧠 Condensed follow-up: '{question}' -> '{standalone}'")
+    return standalone or question
+
+
+def should_reuse_context(memory, question_vector, index, threshold=CONTEXT_REUSE_THRESHOLD):
+    """
+    True if the new standalone question is close enough to the previous one to
+    reuse its chunks, and those chunks came from the same index (path, version)
+    """
+    if memory.last_question_vector is None or not memory.last_documents:
+        return False
+    if memory.last_index != index:
+        return False
+    a = np.asarray(memory.last_question_vector, dtype=np.float32)
+    b = np.asarray(question_vector, dtype=np.float32)
+    similarity = float(a @ b / max(np.linalg.norm(a) * np.linalg.norm(b), 1e-12))
+    return similarity >= threshold
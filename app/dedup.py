@@ -0,0 +1,159 @@
+import re
+import hashlib
+import numpy as np
+
+# MinHash signature length = LSH_BANDS * LSH_ROWS
+LSH_BANDS = 16
+LSH_ROWS = 4
+SHINGLE_WORDS = 3
+
+# Estimated Jaccard similarity above which two chunks are treated as duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.85
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def _normalize(text):
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def _numbers(text):
+    # Variants of a clause often differ only in ages, limits or periods
+    return frozenset(_NUMBER.findall(text))
+
+
+def _shingle_hashes(text):
+    words = text.split(" ")
+    if len(words) < SHINGLE_WORDS:
+        shingles = {text}
+    else:
+        shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") & _MERSENNE_PRIME
+         for s in shingles),
+        dtype=np.uint64
+    )
+
+
+class _MinHasher:
+    def __init__(self, num_perm, seed=1):
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 30, size=num_perm).astype(np.uint64)
+        self.b = rng.randint(0, 1 << 30, size=num_perm).astype(np.uint64)
+
+    def signature(self, hashes):
+        # (a * h + b) mod p for every permutation and shingle at once; uint64 wraps,
+        # which is fine for a hash family as long as it is applied consistently
+        values = (self.a[:, None] * hashes[None, :] + self.b[:, None]) % np.uint64(_MERSENNE_PRIME)
+        return values.min(axis=1)
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _source_ref(doc):
+    return {
+        "source_file": doc.metadata.get("source_file"),
+        "page": doc.metadata.get("page")
+    }
+
+
+def deduplicate_chunks(chunks, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Collapse exact and near-duplicate chunks before embedding
+
+    Exact duplicates are found by hashing normalized text; near duplicates by
+    MinHash signatures bucketed with LSH and confirmed by estimated Jaccard
+    similarity plus identical sets of numbers, so clauses that differ only in
+    figures (e.g. product variants with other ages or limits) are both kept.
+    Each kept chunk lists every chunk it stands for in
+    metadata['duplicate_sources'].
+
+    Returns:
+        (kept_chunks, report) where report counts removed chunks and characters
+    """
+    num_perm = LSH_BANDS * LSH_ROWS
+    hasher = _MinHasher(num_perm)
+    parent = list(range(len(chunks)))
+
+    def union(i, j):
+        root_i, root_j = _find(parent, i), _find(parent, j)
+        if root_i != root_j:
+            # Keep the earliest chunk as the representative
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    # Exact duplicates
+    normalized = [_normalize(chunk.page_content) for chunk in chunks]
+    first_by_hash = {}
+    exact_removed = 0
+    for i, text in enumerate(normalized):
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if digest in first_by_hash:
+            union(first_by_hash[digest], i)
+            exact_removed += 1
+        else:
+            first_by_hash[digest] = i
+
+    # Near duplicates among the remaining unique texts
+    unique = sorted(first_by_hash.values())
+    signatures = {}
+    numbers = {}
+    buckets = {}
+    for i in unique:
+        if not normalized[i]:
+            continue
+        signature = hasher.signature(_shingle_hashes(normalized[i]))
+        signatures[i] = signature
+        numbers[i] = _numbers(normalized[i])
+        for band in range(LSH_BANDS):
+            band_key = (band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes())
+            buckets.setdefault(band_key, []).append(i)
+
+    checked = set()
+    for members in buckets.values():
+        if len(members) < 2:
+            continue
+        for position, i in enumerate(members):
+            for j in members[position + 1:]:
+                if (i, j) in checked:
+                    continue
+                checked.add((i, j))
+                if numbers[i] != numbers[j]:
+                    continue
+                if float(np.mean(signatures[i] == signatures[j])) >= threshold:
+                    union(i, j)
+
+    # Collapse every cluster into its representative
+    clusters = {}
+    for i in range(len(chunks)):
+        clusters.setdefault(_find(parent, i), []).append(i)
+
+    kept = []
+    chars_removed = 0
+    for root in sorted(clusters):
+        members = clusters[root]
+        representative = chunks[root]
+        if len(members) > 1:
+            representative.metadata["duplicate_sources"] = [_source_ref(chunks[i]) for i in members]
+            representative.metadata["duplicate_count"] = len(members)
+            chars_removed += sum(len(chunks[i].page_content) for i in members[1:])
+        kept.append(representative)
+
+    total_removed = len(chunks) - len(kept)
+    report = {
+        "input_chunks": len(chunks),
+        "output_chunks": len(kept),
+        "exact_duplicates_removed": exact_removed,
+        "near_duplicates_removed": total_removed - exact_removed,
+        "chars_removed": chars_removed,
+        "chars_total": sum(len(chunk.page_content) for chunk in chunks)
+    }
+    print(f"🧹 Deduplicated chunks: {len(chunks)} -> {len(kept)} "
+          f"({exact_removed} exact, {total_removed - exact_removed} near duplicates)")
+    return kept, report
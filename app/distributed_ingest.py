@@ -0,0 +1,537 @@
+"""
+Distributed index builds coordinated through a SQLite task queue in a shared directory.
+
+A coordinator splits the PDFs into page-range tasks; any number of worker
+processes, on any node that sees the shared directory and the PDF paths,
+lease tasks, extract/split/embed their pages into a partial FAISS index,
+and the worker that finishes the last task merges the partials and
+publishes the result as a new IndexStore version.
+
+    python -m app.distributed_ingest submit --queue-dir shared/ingest --vector-store vectorstore data/*.pdf
+    python -m app.distributed_ingest worker --queue-dir shared/ingest
+    python -m app.distributed_ingest status --queue-dir shared/ingest
+    python -m app.distributed_ingest local --queue-dir shared/ingest --workers 4 --vector-store vectorstore data/*.pdf
+
+Leases expire by wall clock, so nodes should have roughly synchronized clocks.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import socket
+import sqlite3
+import argparse
+import threading
+import subprocess
+
+QUEUE_FILE = "queue.sqlite"
+PARTIALS_DIR = "partials"
+
+# Pages per task, lease length and renewal interval, and retry policy
+PAGES_PER_TASK = 50
+LEASE_SECONDS = 120
+HEARTBEAT_SECONDS = 30
+MAX_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 10
+
+# Task states
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+# Build states
+RUNNING = "running"
+MERGING = "merging"
+SUCCEEDED = "succeeded"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id TEXT PRIMARY KEY,
+    vector_store_path TEXT NOT NULL,
+    options TEXT NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    error TEXT,
+    report TEXT,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    build_id TEXT NOT NULL,
+    pdf_path TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    page_start INTEGER NOT NULL,
+    page_end INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    not_before REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result_path TEXT,
+    pages INTEGER,
+    chunks INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_build_state ON tasks (build_id, state);
+"""
+
+
+class IngestQueue:
+    """
+    Task queue of distributed index builds in <root>/queue.sqlite.
+
+    Every state change runs in a BEGIN IMMEDIATE transaction, so a task is
+    leased by one worker at a time. The rollback journal is used instead of
+    WAL because WAL does not work on network filesystems.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.path = os.path.join(root, QUEUE_FILE)
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            conn.executescript(_SCHEMA)
+        finally:
+            conn.close()
+
+    def _transaction(self):
+        return _Transaction(self.path)
+
+    def partial_path(self, build_id, task_id, attempt):
+        return os.path.join(self.root, PARTIALS_DIR, build_id, f"{task_id}-{attempt}")
+
+    def submit(self, pdf_paths, vector_store_path="vectorstore", pages_per_task=PAGES_PER_TASK, **options):
+        """
+        Split PDFs into page-range tasks and queue them as one build
+
+        Args:
+            pdf_paths: PDFs to index; paths must be valid on every worker node
+            vector_store_path: Index store root the merged index is published to
+            pages_per_task: Pages per task
+            options: vector_storage and deduplicate, as for load_pdf_and_create_vectors
+
+        Returns:
+            Build id
+        """
+        from app.extractors import count_pages
+        from app.upload_store import file_sha256
+
+        tasks = []
+        seen_hashes = set()
+        for pdf_path in pdf_paths:
+            pdf_path = os.path.abspath(pdf_path)
+            file_hash = file_sha256(pdf_path)
+            if file_hash in seen_hashes:
+                print(f"♻️ Skipping {pdf_path}: same content as an earlier file")
+                continue
+            seen_hashes.add(file_hash)
+            page_count = count_pages(pdf_path)
+            for start in range(0, page_count, pages_per_task):
+                tasks.append((pdf_path, file_hash, start, min(start + pages_per_task, page_count)))
+        if not tasks:
+            raise ValueError("No pages to index")
+
+        build_id = uuid.uuid4().hex[:12]
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO builds (id, vector_store_path, options, state, created) VALUES (?, ?, ?, ?, ?)",
+                (build_id, os.path.abspath(vector_store_path), json.dumps(options), RUNNING, time.time())
+            )
+            conn.executemany(
+                "INSERT INTO tasks (build_id, pdf_path, file_hash, page_start, page_end, state) VALUES (?, ?, ?, ?, ?, ?)",
+                [(build_id, *task, PENDING) for task in tasks]
+            )
+        print(f"🔄 Queued build {build_id}: {len(tasks)} task(s) from {len(seen_hashes)} PDF(s)")
+        return build_id
+
+    def lease(self, worker_id):
+        """Lease the next runnable task (pending, or leased with an expired lease), or None"""
+        while True:
+            now = time.time()
+            with self._transaction() as conn:
+                task = conn.execute(
+                    "SELECT t.* FROM tasks t JOIN builds b ON b.id = t.build_id "
+                    "WHERE b.state = ? AND t.not_before <= ? "
+                    "AND (t.state = ? OR (t.state = ? AND t.lease_expires < ?)) "
+                    "ORDER BY t.attempts, t.id LIMIT 1",
+                    (RUNNING, now, PENDING, LEASED, now)
+                ).fetchone()
+                if task is None:
+                    return None
+                if task["attempts"] >= MAX_ATTEMPTS:
+                    # Its last lease expired without a heartbeat: the worker died
+                    self._fail_task(conn, task, task["error"] or "Lease expired too many times")
+                    continue
+                conn.execute(
+                    "UPDATE tasks SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                    (LEASED, worker_id, now + LEASE_SECONDS, task["id"])
+                )
+                task = dict(task)
+                task["attempts"] += 1
+                task["options"] = json.loads(conn.execute(
+                    "SELECT options FROM builds WHERE id = ?", (task["build_id"],)
+                ).fetchone()[0])
+                return task
+
+    def heartbeat(self, task_id, worker_id):
+        """Extend a task lease; False if the lease was lost to another worker"""
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE id = ? AND worker = ? AND state = ?",
+                (time.time() + LEASE_SECONDS, task_id, worker_id, LEASED)
+            ).rowcount
+        return updated == 1
+
+    def complete(self, task_id, worker_id, result_path, pages, chunks):
+        """Mark a task done; False if the lease was lost and the result must be discarded"""
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE tasks SET state = ?, result_path = ?, pages = ?, chunks = ?, error = NULL "
+                "WHERE id = ? AND worker = ? AND state = ?",
+                (DONE, result_path, pages, chunks, task_id, worker_id, LEASED)
+            ).rowcount
+        return updated == 1
+
+    def fail(self, task_id, worker_id, error):
+        """Return a failed task to the queue with a delay, or fail it (and its build) after MAX_ATTEMPTS"""
+        with self._transaction() as conn:
+            task = conn.execute(
+                "SELECT * FROM tasks WHERE id = ? AND worker = ? AND state = ?", (task_id, worker_id, LEASED)
+            ).fetchone()
+            if task is None:
+                return
+            if task["attempts"] >= MAX_ATTEMPTS:
+                self._fail_task(conn, task, error)
+            else:
+                conn.execute(
+                    "UPDATE tasks SET state = ?, worker = NULL, error = ?, not_before = ? WHERE id = ?",
+                    (PENDING, error, time.time() + RETRY_DELAY_SECONDS * task["attempts"], task_id)
+                )
+
+    def _fail_task(self, conn, task, error):
+        conn.execute("UPDATE tasks SET state = ?, error = ? WHERE id = ?", (FAILED, error, task["id"]))
+        conn.execute(
+            "UPDATE builds SET state = ?, error = ?, finished = ? WHERE id = ? AND state IN (?, ?)",
+            (FAILED, f"Task {task['id']} ({os.path.basename(task['pdf_path'])} pages "
+                     f"{task['page_start'] + 1}-{task['page_end']}) failed: {error}",
+             time.time(), task["build_id"], RUNNING, MERGING)
+        )
+        print(f"❌ Task {task['id']} of build {task['build_id']} failed permanently: {error}")
+
+    def claim_merge(self, worker_id):
+        """
+        Claim a build whose tasks are all done (or whose merger died)
+
+        Returns:
+            Build row as a dict, or None
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            build = conn.execute(
+                "SELECT * FROM builds b WHERE (b.state = ? OR (b.state = ? AND b.lease_expires < ?)) "
+                "AND NOT EXISTS (SELECT 1 FROM tasks t WHERE t.build_id = b.id AND t.state != ?) "
+                "ORDER BY b.created LIMIT 1",
+                (RUNNING, MERGING, now, DONE)
+            ).fetchone()
+            if build is None:
+                return None
+            conn.execute(
+                "UPDATE builds SET state = ?, worker = ?, lease_expires = ? WHERE id = ?",
+                (MERGING, worker_id, now + LEASE_SECONDS, build["id"])
+            )
+            return dict(build)
+
+    def heartbeat_merge(self, build_id, worker_id):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE builds SET lease_expires = ? WHERE id = ? AND worker = ? AND state = ?",
+                (time.time() + LEASE_SECONDS, build_id, worker_id, MERGING)
+            )
+
+    def finish_build(self, build_id, state, error=None, report=None):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE builds SET state = ?, error = ?, report = ?, finished = ? WHERE id = ?",
+                (state, error, json.dumps(report) if report else None, time.time(), build_id)
+            )
+
+    def tasks(self, build_id):
+        with self._transaction() as conn:
+            return [dict(row) for row in conn.execute("SELECT * FROM tasks WHERE build_id = ? ORDER BY id", (build_id,))]
+
+    def status(self, build_id=None):
+        """Builds (or one build) with task counts per state, newest first"""
+        with self._transaction() as conn:
+            if build_id:
+                builds = conn.execute("SELECT * FROM builds WHERE id = ?", (build_id,)).fetchall()
+            else:
+                builds = conn.execute("SELECT * FROM builds ORDER BY created DESC").fetchall()
+            result = []
+            for build in builds:
+                counts = dict(conn.execute(
+                    "SELECT state, COUNT(*) FROM tasks WHERE build_id = ? GROUP BY state", (build["id"],)
+                ).fetchall())
+                result.append({**dict(build), "tasks": counts})
+            return result
+
+    def active(self):
+        """True while any build is running or merging"""
+        with self._transaction() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM builds WHERE state IN (?, ?)", (RUNNING, MERGING)
+            ).fetchone()[0] > 0
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT on a fresh connection"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self.conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+
+
+class _Heartbeat:
+    """Calls beat() every interval on a background thread while the block runs"""
+
+    def __init__(self, beat, interval=HEARTBEAT_SECONDS):
+        self.beat = beat
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.beat()
+            except Exception as e:
+                print(f"⚠️ Heartbeat failed: {e}")
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name="ingest-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def process_task(queue, task):
+    """
+    Extract, split, deduplicate and embed one page range into a partial index
+
+    Returns:
+        (result_path, pages, chunks)
+    """
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_community.vectorstores import FAISS
+    from app.dedup import deduplicate_chunks
+    from app.embeddings import get_embeddings
+    from app.extractors import extract_pages
+    from app.retriever import EMBED_BATCH_SIZE
+    from app.rules import build_rule_index
+
+    result_path = queue.partial_path(task["build_id"], task["id"], task["attempts"])
+    shutil.rmtree(result_path, ignore_errors=True)
+    os.makedirs(result_path)
+
+    documents = extract_pages(task["pdf_path"], task["file_hash"], page_range=(task["page_start"], task["page_end"]))
+    documents = [doc for doc in documents if doc.page_content.strip()]
+    if not documents:
+        return result_path, 0, 0
+
+    chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200).split_documents(documents)
+    if task["options"].get("deduplicate", True):
+        chunks, _ = deduplicate_chunks(chunks)
+
+    embeddings = get_embeddings()
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        vectors.extend(embeddings.embed_documents(texts[start:start + EMBED_BATCH_SIZE]))
+
+    FAISS.from_embeddings(
+        list(zip(texts, vectors)),
+        embeddings,
+        metadatas=[chunk.metadata for chunk in chunks]
+    ).save_local(result_path)
+    build_rule_index(documents, result_path)
+    return result_path, len(documents), len(chunks)
+
+
+def merge_build(queue, build):
+    """Merge a build's partial indexes and publish them as a new index version"""
+    import numpy as np
+    from langchain_community.vectorstores import FAISS
+    from app.embeddings import get_embeddings
+    from app.index_store import IndexStore
+    from app.quantization import compress_index, save_full_vectors, index_bytes_per_vector
+    from app.retriever import INGESTION_REPORT_FILE
+    from app.rules import merge_rule_indexes
+
+    options = json.loads(build["options"])
+    tasks = queue.tasks(build["id"])
+    partials = [task["result_path"] for task in tasks if task["chunks"]]
+    if not partials:
+        raise ValueError("No text content extracted from any task")
+
+    start = time.perf_counter()
+    merged = None
+    for path in partials:
+        partial = FAISS.load_local(path, get_embeddings(), allow_dangerous_deserialization=True)
+        if merged is None:
+            merged = partial
+        else:
+            merged.merge_from(partial)
+
+    store = IndexStore(build["vector_store_path"])
+    staged = store.begin_version()
+    try:
+        report = {
+            "files": len({task["file_hash"] for task in tasks}),
+            "pages": sum(task["pages"] or 0 for task in tasks),
+            "chunks": merged.index.ntotal,
+            "tasks": len(tasks),
+            "workers": sorted({task["worker"] for task in tasks if task["worker"]}),
+            "retried_tasks": sum(1 for task in tasks if task["attempts"] > 1),
+            "build_id": build["id"]
+        }
+        vector_storage = options.get("vector_storage", "float32")
+        if vector_storage != "float32":
+            full_vectors = merged.index.reconstruct_n(0, merged.index.ntotal)
+            merged.index = compress_index(np.asarray(full_vectors, dtype=np.float32), vector_storage)
+            save_full_vectors(full_vectors, staged.path)
+            report["vector_storage"] = vector_storage
+            report["index_bytes_per_vector"] = index_bytes_per_vector(merged.index)
+        merged.save_local(staged.path)
+        report["rules"] = merge_rule_indexes(partials, staged.path)
+        report["merge_seconds"] = round(time.perf_counter() - start, 2)
+        with open(os.path.join(staged.path, INGESTION_REPORT_FILE), "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+        store.publish(staged)
+    except Exception:
+        store.abort(staged)
+        raise
+
+    shutil.rmtree(os.path.join(queue.root, PARTIALS_DIR, build["id"]), ignore_errors=True)
+    return report
+
+
+def run_worker(queue_dir, worker_id=None, poll_interval=2.0, exit_when_idle=False):
+    """
+    Lease and process tasks until stopped; merge builds whose tasks are all done
+
+    Args:
+        queue_dir: Shared queue directory
+        worker_id: Name of this worker (default host-pid)
+        poll_interval: Seconds between polls when there is nothing to do
+        exit_when_idle: Return once no build is running or merging
+    """
+    queue = IngestQueue(queue_dir)
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    print(f"👷 Ingestion worker {worker_id} polling {queue_dir}")
+
+    while True:
+        build = queue.claim_merge(worker_id)
+        if build is not None:
+            print(f"🔄 Merging build {build['id']}")
+            try:
+                with _Heartbeat(lambda: queue.heartbeat_merge(build["id"], worker_id)):
+                    report = merge_build(queue, build)
+                queue.finish_build(build["id"], SUCCEEDED, report=report)
+                print(f"✅ Build {build['id']} published: {report['chunks']} chunks from {report['tasks']} task(s)")
+            except Exception as e:
+                queue.finish_build(build["id"], FAILED, error=str(e))
+                print(f"❌ Merging build {build['id']} failed: {e}")
+            continue
+
+        task = queue.lease(worker_id)
+        if task is None:
+            if exit_when_idle and not queue.active():
+                return
+            time.sleep(poll_interval)
+            continue
+
+        label = f"{os.path.basename(task['pdf_path'])} pages {task['page_start'] + 1}-{task['page_end']}"
+        print(f"🔄 Task {task['id']} (attempt {task['attempts']}): {label}")
+        try:
+            with _Heartbeat(lambda: queue.heartbeat(task["id"], worker_id)):
+                result_path, pages, chunks = process_task(queue, task)
+            if not queue.complete(task["id"], worker_id, result_path, pages, chunks):
+                print(f"⚠️ Lost the lease on task {task['id']}; discarding its result")
+                shutil.rmtree(result_path, ignore_errors=True)
+            else:
+                print(f"✅ Task {task['id']}: {pages} page(s), {chunks} chunk(s)")
+        except Exception as e:
+            print(f"❌ Task {task['id']} failed: {e}")
+            queue.fail(task["id"], worker_id, str(e))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed index builds over a shared queue directory")
+    parser.add_argument("command", choices=("submit", "worker", "status", "local"))
+    parser.add_argument("pdfs", nargs="*", help="PDF files (submit/local)")
+    parser.add_argument("--queue-dir", required=True, help="Shared queue directory")
+    parser.add_argument("--vector-store", default="vectorstore", help="Index store root to publish to")
+    parser.add_argument("--pages-per-task", type=int, default=PAGES_PER_TASK)
+    parser.add_argument("--vector-storage", default="float32", help="float32, fp16 or int8")
+    parser.add_argument("--no-dedup", action="store_true", help="Keep duplicate chunks")
+    parser.add_argument("--workers", type=int, default=2, help="Local worker processes (local)")
+    parser.add_argument("--worker-id", help="Worker name (worker)")
+    parser.add_argument("--exit-when-idle", action="store_true", help="Worker exits when no build is active")
+    parser.add_argument("--build", help="Build id (status)")
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        run_worker(args.queue_dir, args.worker_id, exit_when_idle=args.exit_when_idle)
+        return
+
+    queue = IngestQueue(args.queue_dir)
+    if args.command == "status":
+        print(json.dumps(queue.status(args.build), indent=1))
+        return
+
+    if not args.pdfs:
+        parser.error("PDF files are required")
+    build_id = queue.submit(
+        args.pdfs,
+        args.vector_store,
+        pages_per_task=args.pages_per_task,
+        vector_storage=args.vector_storage,
+        deduplicate=not args.no_dedup
+    )
+    if args.command == "submit":
+        print(build_id)
+        return
+
+    # local: run several worker processes on this machine until the build finishes
+    workers = [
+        subprocess.Popen([
+            sys.executable, "-m", "app.distributed_ingest", "worker",
+            "--queue-dir", args.queue_dir, "--worker-id", f"local-{i}", "--exit-when-idle"
+        ])
+        for i in range(args.workers)
+    ]
+    for worker in workers:
+        worker.wait()
+    print(json.dumps(queue.status(build_id), indent=1))
+
+
+if __name__ == "__main__":
+    main()
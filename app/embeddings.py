@@ -0,0 +1,130 @@
+import re
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from langchain_core.embeddings import Embeddings
+from langchain_huggingface import HuggingFaceEmbeddings
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Query embedding cache size and micro-batching window
+QUERY_CACHE_SIZE = 4096
+BATCH_WINDOW_MS = 5
+MAX_BATCH_SIZE = 32
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def _cache_key(text):
+    # MiniLM is uncased, so case and whitespace differences give the same vector
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+class _QueryBatcher:
+    """
+    Collects query encodings that arrive within a short window and encodes
+    them in one forward pass on a background thread.
+    """
+
+    def __init__(self, encode_batch, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH_SIZE):
+        self.encode_batch = encode_batch
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.batches = 0
+        self.batched_queries = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="query-embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text):
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(pending) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = list(dict.fromkeys(text for text, _ in pending))
+            try:
+                vectors = dict(zip(texts, self.encode_batch(texts)))
+                for text, future in pending:
+                    future.set_result(vectors[text])
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+
+            self.batches += 1
+            self.batched_queries += len(pending)
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with an LRU cache of query vectors and micro-batched
+    query encoding. Document embedding is passed through unchanged.
+    """
+
+    def __init__(self, base, cache_size=QUERY_CACHE_SIZE, window_ms=BATCH_WINDOW_MS):
+        self.base = base
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._batcher = _QueryBatcher(base.embed_documents, window_ms)
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        key = _cache_key(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        vector = self._batcher.submit(key).result()
+
+        with self._lock:
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return vector
+
+    def stats(self):
+        batches = self._batcher.batches
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cached_queries": len(self._cache),
+            "batches": batches,
+            "avg_batch_size": round(self._batcher.batched_queries / batches, 2) if batches else 0.0
+        }
+
+
+def get_embeddings():
+    """
+    Process-wide embedding model, loaded once and shared by every session and index
+    """
+    global _embeddings
+    with _embeddings_lock:
+        if _embeddings is None:
+            print(f"🔄 Loading embedding model: {EMBEDDING_MODEL}")
+            _embeddings = CachedQueryEmbeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL))
+        return _embeddings
@@ -0,0 +1,149 @@
+import os
+import zlib
+import sqlite3
+import threading
+
+EXTRACTION_CACHE_PATH = os.path.join(".cache", "extraction.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS page_text (
+    page_key TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    text BLOB NOT NULL,
+    PRIMARY KEY (page_key, extractor)
+);
+CREATE TABLE IF NOT EXISTS file_pages (
+    file_hash TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    extractor TEXT NOT NULL,
+    page_key TEXT NOT NULL,
+    PRIMARY KEY (file_hash, extractor, page)
+);
+CREATE TABLE IF NOT EXISTS files (
+    file_hash TEXT NOT NULL,
+    extractor TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    PRIMARY KEY (file_hash, extractor)
+);
+"""
+
+
+def page_key(file_hash, page_number):
+    """
+    Cache key of one page: (file hash, page number). The extractor version is
+    the other half of the page_text key. Content streams alone are not used:
+    pages drawing the same stream over different fonts or XObjects would share
+    one key and get each other's text.
+    """
+    return f"f:{file_hash}:{page_number}"
+
+
+class ExtractionCache:
+    """
+    Persistent page-granular text extraction cache in a single SQLite file.
+
+    Page text is stored zlib-compressed, keyed by (page key, extractor
+    version); file_pages maps (file hash, extractor version, page number)
+    to page keys, and files records which files were extracted completely.
+    """
+
+    def __init__(self, path=EXTRACTION_CACHE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get_file(self, file_hash, extractor):
+        """All page texts of a completely extracted file, or None"""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT page_count FROM files WHERE file_hash = ? AND extractor = ?",
+            (file_hash, extractor)
+        ).fetchone()
+        if row is None:
+            return None
+
+        rows = conn.execute(
+            "SELECT fp.page, pt.text FROM file_pages fp "
+            "JOIN page_text pt ON pt.page_key = fp.page_key AND pt.extractor = fp.extractor "
+            "WHERE fp.file_hash = ? AND fp.extractor = ? ORDER BY fp.page",
+            (file_hash, extractor)
+        ).fetchall()
+        if len(rows) != row[0]:
+            return None
+        return [zlib.decompress(text).decode("utf-8") for _, text in rows]
+
+    def get_page(self, key, extractor):
+        """Cached text of one page, or None"""
+        row = self._connect().execute(
+            "SELECT text FROM page_text WHERE page_key = ? AND extractor = ?",
+            (key, extractor)
+        ).fetchone()
+        return zlib.decompress(row[0]).decode("utf-8") if row else None
+
+    def put_file(self, file_hash, extractor, pages):
+        """
+        Store the pages of one file
+
+        Args:
+            pages: List of (page_key, text) in page order
+        """
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO page_text (page_key, extractor, text) VALUES (?, ?, ?)",
+                [(key, extractor, zlib.compress(text.encode("utf-8"), 6)) for key, text in pages]
+            )
+            conn.execute("DELETE FROM file_pages WHERE file_hash = ? AND extractor = ?", (file_hash, extractor))
+            conn.executemany(
+                "INSERT INTO file_pages (file_hash, page, extractor, page_key) VALUES (?, ?, ?, ?)",
+                [(file_hash, number, extractor, key) for number, (key, _) in enumerate(pages)]
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO files (file_hash, extractor, page_count) VALUES (?, ?, ?)",
+                (file_hash, extractor, len(pages))
+            )
+
+    def put_pages(self, extractor, pages):
+        """
+        Store page texts without marking any file as completely extracted
+
+        Args:
+            pages: List of (page_key, text)
+        """
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO page_text (page_key, extractor, text) VALUES (?, ?, ?)",
+                [(key, extractor, zlib.compress(text.encode("utf-8"), 6)) for key, text in pages]
+            )
+
+    def stats(self):
+        conn = self._connect()
+        return {
+            "files": conn.execute("SELECT COUNT(*) FROM files").fetchone()[0],
+            "pages": conn.execute("SELECT COUNT(*) FROM page_text").fetchone()[0],
+            "bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache(path=EXTRACTION_CACHE_PATH):
+    """Process-wide extraction cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache(path)
+        return _cache
@@ -0,0 +1,177 @@
+import os
+from langchain.schema import Document
+from app.extraction_cache import get_extraction_cache, page_key
+
+# Backends tried for each page, fastest first
+DEFAULT_BACKENDS = ("pymupdf", "pypdf", "pypdf2")
+
+
+class PyMuPDFBackend:
+    """PyMuPDF (fitz) text extraction - the fastest backend"""
+    name = "pymupdf"
+    version = "pymupdf-1"
+
+    def __init__(self, pdf_path):
+        import fitz
+        self.doc = fitz.open(pdf_path)
+        self.page_count = self.doc.page_count
+
+    def page_text(self, page_num):
+        return self.doc[page_num].get_text("text")
+
+    def close(self):
+        self.doc.close()
+
+
+class PyPDFBackend:
+    """pypdf text extraction (what PyPDFLoader uses)"""
+    name = "pypdf"
+    version = "pypdf-1"
+    module_name = "pypdf"
+
+    def __init__(self, pdf_path):
+        module = __import__(self.module_name)
+        self.reader = module.PdfReader(pdf_path)
+        self.page_count = len(self.reader.pages)
+
+    def page_text(self, page_num):
+        return self.reader.pages[page_num].extract_text() or ""
+
+    def close(self):
+        pass
+
+
+class PyPDF2Backend(PyPDFBackend):
+    """Legacy PyPDF2 text extraction, kept as the last resort"""
+    name = "pypdf2"
+    version = "pypdf2-1"
+    module_name = "PyPDF2"
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (PyMuPDFBackend, PyPDFBackend, PyPDF2Backend)
+}
+
+
+def engine_version(backends=DEFAULT_BACKENDS):
+    """Extraction cache version of a backend chain"""
+    return "engine-2:" + ",".join(BACKENDS[name].version for name in backends)
+
+
+def _open_backends(pdf_path, backends):
+    opened = []
+    for name in backends:
+        try:
+            opened.append(BACKENDS[name](pdf_path))
+        except ImportError:
+            print(f"⚠️ PDF backend {name} is not installed")
+        except Exception as e:
+            print(f"⚠️ PDF backend {name} cannot open {pdf_path}: {e}")
+    return opened
+
+
+def count_pages(pdf_path, backends=DEFAULT_BACKENDS):
+    """
+    Number of pages in a PDF
+
+    Raises:
+        ValueError: If no backend can open the file
+    """
+    opened = _open_backends(pdf_path, backends)
+    if not opened:
+        raise ValueError(f"No PDF backend could open {pdf_path}")
+    try:
+        return opened[0].page_count
+    finally:
+        for backend in opened:
+            backend.close()
+
+
+def extract_pages(pdf_path, file_hash, backends=DEFAULT_BACKENDS, use_cache=True, page_range=None):
+    """
+    Extract one Document per page, falling back to the next backend per page
+
+    Args:
+        pdf_path: PDF file to read
+        file_hash: Content hash of the file (extraction cache key)
+        backends: Backend names in order of preference
+        use_cache: Read and populate the page extraction cache
+        page_range: Optional (start, end) page numbers to extract, end exclusive
+
+    Raises:
+        ValueError: If no backend can open the file
+    """
+    version = engine_version(backends)
+    cache = get_extraction_cache() if use_cache else None
+
+    def to_documents(texts, extractors, first_page=0):
+        return [
+            Document(
+                page_content=text,
+                metadata={
+                    'source': pdf_path,
+                    'source_file': os.path.basename(pdf_path),
+                    'page': page_num,
+                    'extractor': extractor
+                }
+            )
+            for page_num, (text, extractor) in enumerate(zip(texts, extractors), start=first_page)
+        ]
+
+    start, end = page_range or (0, None)
+    if cache is not None:
+        cached = cache.get_file(file_hash, version)
+        if cached is not None:
+            cached = cached[start:end]
+            print(f"⚡ Extraction cache hit: {pdf_path} ({len(cached)} pages)")
+            return to_documents(cached, ["cache"] * len(cached), start)
+
+    opened = _open_backends(pdf_path, backends)
+    if not opened:
+        raise ValueError(f"No PDF backend could open {pdf_path}")
+
+    try:
+        page_count = opened[0].page_count
+        pages = []
+        extractors = []
+        complete = True
+        fallbacks = 0
+
+        for page_num in range(start, page_count if end is None else min(end, page_count)):
+            key = page_key(file_hash, page_num)
+
+            text = cache.get_page(key, version) if cache is not None else None
+            extractor = "cache"
+            if text is None:
+                for backend in opened:
+                    try:
+                        text = backend.page_text(page_num)
+                        extractor = backend.name
+                        break
+                    except Exception as page_error:
+                        print(f"⚠️ {backend.name} failed on page {page_num} of {pdf_path}: {page_error}")
+                        fallbacks += 1
+                if text is None:
+                    text = ""
+                    extractor = "failed"
+                    complete = False
+
+            pages.append((key, text))
+            extractors.append(extractor)
+    finally:
+        for backend in opened:
+            backend.close()
+
+    # Files with unreadable pages are not cached so they are retried next time;
+    # a page range only caches its pages, not the file as complete
+    if cache is not None and complete:
+        if page_range is None:
+            cache.put_file(file_hash, version, pages)
+        else:
+            cache.put_pages(version, pages)
+
+    extracted = sum(1 for extractor in extractors if extractor not in ("cache", "failed"))
+    print(f"🔍 Extracted {extracted} page(s), reused {extractors.count('cache')} cached, "
+          f"{fallbacks} backend fallback(s): {pdf_path}")
+    return to_documents([text for _, text in pages], extractors, start)
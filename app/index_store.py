@@ -0,0 +1,247 @@
+import os
+import time
+import uuid
+import shutil
+import threading
+from contextlib import contextmanager
+
+VERSIONS_DIR = "versions"
+LEASES_DIR = "leases"
+CURRENT_FILE = "CURRENT"
+
+# Published versions kept on disk in addition to those still leased by readers
+KEEP_VERSIONS = 2
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive advisory lock on path, held across processes sharing the
+    filesystem (fcntl.flock). Platforms without fcntl get no cross-process
+    locking.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class StagedVersion:
+    """An index version being written; invisible to readers until published"""
+
+    def __init__(self, version, path):
+        self.version = version
+        self.path = path
+
+
+class IndexLease:
+    """
+    A reader's hold on one index version. The version is not garbage
+    collected while any lease on it is held, in this or another process.
+    """
+
+    def __init__(self, store, version, path, lease_file):
+        self.store = store
+        self.version = version
+        self.path = path
+        self._lease_file = lease_file
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        if self._lease_file:
+            try:
+                os.remove(self._lease_file)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class IndexStore:
+    """
+    Versioned index directory with atomic publishing.
+
+    Layout under root:
+        versions/<version>/   one complete FAISS index per version
+        CURRENT               name of the published version, replaced atomically
+        leases/<version>/     one file per reader holding that version
+
+    Writers build into a staging directory and publish by renaming it into
+    versions/ and flipping CURRENT, so readers never block and never see a
+    half-written index. A root that directly contains index.faiss (the
+    pre-versioning layout) is served as a single read-only "legacy" version.
+    """
+
+    def __init__(self, root="vectorstore"):
+        self.root = os.path.abspath(root)
+        self.versions_dir = os.path.join(self.root, VERSIONS_DIR)
+        self.leases_dir = os.path.join(self.root, LEASES_DIR)
+
+    def _is_legacy(self):
+        return os.path.exists(os.path.join(self.root, "index.faiss"))
+
+    def version_path(self, version):
+        if version == "legacy":
+            return self.root
+        return os.path.join(self.versions_dir, version)
+
+    def current_version(self):
+        """Name of the published version, or None if nothing is published"""
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), encoding="utf-8") as f:
+                version = f.read().strip()
+            return version or None
+        except OSError:
+            return "legacy" if self._is_legacy() else None
+
+    def exists(self):
+        return self.current_version() is not None
+
+    def list_versions(self):
+        """Published version names, oldest first"""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(self.versions_dir)
+            if not name.startswith(".")
+        )
+
+    def begin_version(self):
+        """Create a private staging directory for a new index version"""
+        # Nanosecond part keeps versions begun within one second in order, so
+        # name order is build order for list_versions() and gc()
+        now = time.time_ns()
+        version = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now // 10**9))}-{now % 10**9:09d}-{uuid.uuid4().hex[:6]}"
+        path = os.path.join(self.versions_dir, f".staging-{version}")
+        os.makedirs(path)
+        return StagedVersion(version, path)
+
+    def abort(self, staged):
+        """Discard a staged version that failed to build"""
+        shutil.rmtree(staged.path, ignore_errors=True)
+
+    def publish(self, staged, keep=KEEP_VERSIONS):
+        """
+        Atomically make a staged version the current one and collect old versions
+        """
+        final_path = self.version_path(staged.version)
+        os.rename(staged.path, final_path)
+
+        pointer = os.path.join(self.root, CURRENT_FILE)
+        tmp_pointer = f"{pointer}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_pointer, "w", encoding="utf-8") as f:
+            f.write(staged.version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_pointer, pointer)
+        print(f"✅ Published index version {staged.version}")
+
+        self.gc(keep=keep)
+        return final_path
+
+    def unpublish(self, keep=0):
+        """Stop serving any version; readers holding leases are unaffected"""
+        try:
+            os.remove(os.path.join(self.root, CURRENT_FILE))
+        except OSError:
+            pass
+        self.gc(keep=keep)
+
+    def acquire(self, version=None):
+        """
+        Take a lease on the current (or given) version
+
+        Raises:
+            ValueError: If no index has been published
+        """
+        for _ in range(3):
+            version = version or self.current_version()
+            if version is None:
+                raise ValueError(f"Vector store not found at: {self.root}")
+
+            lease_file = None
+            if version != "legacy":
+                lease_dir = os.path.join(self.leases_dir, version)
+                os.makedirs(lease_dir, exist_ok=True)
+                lease_file = os.path.join(lease_dir, f"{os.getpid()}-{uuid.uuid4().hex[:8]}")
+                open(lease_file, "w").close()
+
+            path = self.version_path(version)
+            if os.path.isdir(path):
+                return IndexLease(self, version, path, lease_file)
+
+            # Collected between reading CURRENT and taking the lease; retry
+            if lease_file:
+                os.remove(lease_file)
+            version = None
+        raise ValueError(f"Could not acquire a consistent index version at: {self.root}")
+
+    def readers(self, version):
+        """Number of live leases on a version across all processes"""
+        lease_dir = os.path.join(self.leases_dir, version)
+        if not os.path.isdir(lease_dir):
+            return 0
+        live = 0
+        for name in os.listdir(lease_dir):
+            try:
+                pid = int(name.split("-", 1)[0])
+            except ValueError:
+                continue
+            if _pid_alive(pid):
+                live += 1
+            else:
+                # Reader process died without releasing
+                try:
+                    os.remove(os.path.join(lease_dir, name))
+                except OSError:
+                    pass
+        return live
+
+    def gc(self, keep=KEEP_VERSIONS):
+        """
+        Delete versions that are not current, not among the newest `keep`,
+        and not leased by any reader. Returns the deleted version names.
+        """
+        current = self.current_version()
+        versions = self.list_versions()
+        protected = set(versions[-keep:]) if keep else set()
+        if current:
+            protected.add(current)
+
+        removed = []
+        for version in versions:
+            if version in protected or self.readers(version) > 0:
+                continue
+            shutil.rmtree(self.version_path(version), ignore_errors=True)
+            shutil.rmtree(os.path.join(self.leases_dir, version), ignore_errors=True)
+            removed.append(version)
+
+        if removed:
+            print(f"🧹 Removed {len(removed)} old index version(s): {removed}")
+        return removed
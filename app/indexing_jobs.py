@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import uuid
+import queue
+import threading
+from app.retriever import load_pdf_and_create_vectors
+from app.index_store import _pid_alive, file_lock
+
+JOBS_DIR = "jobs"
+
+# Held in the index store root while a build runs, serializing builds of one
+# index across every process that shares the directory
+BUILD_LOCK_FILE = ".build.lock"
+
+# Job states persisted in jobs/<job_id>.json
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class IndexingService:
+    """
+    Local job queue that builds indexes on a background worker thread.
+
+    Jobs are executed one at a time, so uploads from several sessions are
+    serialized; builds of the same index from other processes (e.g. API
+    workers) wait on a file lock in the index store root. Status and per-stage
+    progress are persisted under jobs_dir, so a browser refresh neither loses
+    nor kills a running build and any process sharing jobs_dir can report it.
+    Each job publishes a new IndexStore version only when complete, leaving
+    the previous version queryable during the rebuild.
+    """
+
+    def __init__(self, jobs_dir=JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="indexing-worker", daemon=True)
+        self._worker.start()
+        self._fail_abandoned_jobs()
+
+    def _job_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def _fail_abandoned_jobs(self):
+        # Jobs left queued/running by a process that is gone will never finish;
+        # jobs owned by a live sibling worker process are left alone
+        for job in self.list_jobs():
+            pid = job.get("pid")
+            owner_alive = bool(pid) and pid != os.getpid() and _pid_alive(pid)
+            if job["state"] in (QUEUED, RUNNING) and not owner_alive:
+                self._update(job["id"], state=FAILED, error="Interrupted by a server restart")
+
+    def _update(self, job_id, **fields):
+        with self._lock, file_lock(os.path.join(self.jobs_dir, ".lock")):
+            job = self.status(job_id) or {"id": job_id}
+            job.update(fields)
+            job["updated"] = time.time()
+            _write_json(self._job_path(job_id), job)
+            return job
+
+    def submit(self, pdf_paths, vector_store_path="vectorstore", **build_kwargs):
+        """
+        Queue an index build and return its job id
+
+        Args:
+            pdf_paths: PDF files to index, or a callable returning them, called
+                once the build holds the index lock so it sees every upload
+                stored before it started
+            vector_store_path: Directory the finished index is published to
+            build_kwargs: Extra keyword arguments for load_pdf_and_create_vectors
+        """
+        job_id = uuid.uuid4().hex[:12]
+        pdf_source = pdf_paths if callable(pdf_paths) else list(pdf_paths)
+        self._update(
+            job_id,
+            state=QUEUED,
+            stage="queued",
+            progress=0.0,
+            message="Waiting for earlier jobs to finish",
+            pdf_paths=None if callable(pdf_source) else pdf_source,
+            vector_store_path=vector_store_path,
+            created=time.time(),
+            pid=os.getpid(),
+            error=None
+        )
+        self._queue.put((job_id, pdf_source, vector_store_path, build_kwargs))
+        print(f"🔄 Queued indexing job {job_id} for {vector_store_path}")
+        return job_id
+
+    def status(self, job_id):
+        """Return the persisted status of a job, or None if unknown"""
+        try:
+            with open(self._job_path(job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list_jobs(self):
+        """All known jobs, oldest first"""
+        jobs = []
+        for name in os.listdir(self.jobs_dir):
+            if name.endswith(".json"):
+                job = self.status(name[:-len(".json")])
+                if job:
+                    jobs.append(job)
+        return sorted(jobs, key=lambda job: job.get("created", 0))
+
+    def latest_job(self, vector_store_path="vectorstore"):
+        """Most recent job targeting vector_store_path, or None"""
+        jobs = [job for job in self.list_jobs() if job.get("vector_store_path") == vector_store_path]
+        return jobs[-1] if jobs else None
+
+    def _run(self):
+        while True:
+            job_id, pdf_source, vector_store_path, build_kwargs = self._queue.get()
+            try:
+                self._update(job_id, stage="waiting", message="Waiting for other builds of this index")
+                with file_lock(os.path.join(vector_store_path, BUILD_LOCK_FILE)):
+                    pdf_paths = pdf_source() if callable(pdf_source) else pdf_source
+                    self._update(job_id, state=RUNNING, stage="starting", message="Starting",
+                                 pdf_paths=pdf_paths, started=time.time())
+
+                    def progress(stage, fraction, message):
+                        self._update(job_id, stage=stage, progress=round(fraction, 3), message=message)
+
+                    load_pdf_and_create_vectors(
+                        pdf_paths,
+                        vector_store_path=vector_store_path,
+                        progress_callback=progress,
+                        **build_kwargs
+                    )
+
+                self._update(job_id, state=SUCCEEDED, stage="done", progress=1.0,
+                             message="Index ready", finished=time.time())
+                print(f"✅ Indexing job {job_id} finished")
+            except Exception as e:
+                self._update(job_id, state=FAILED, message="Indexing failed", error=str(e), finished=time.time())
+                print(f"❌ Indexing job {job_id} failed: {e}")
+            finally:
+                self._queue.task_done()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_indexing_service(jobs_dir=JOBS_DIR):
+    """Process-wide indexing service shared by all Streamlit sessions"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = IndexingService(jobs_dir)
+        return _service
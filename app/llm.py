@@ -0,0 +1,129 @@
+import os
+import threading
+import streamlit as st
+from dotenv import load_dotenv
+from langchain_groq import ChatGroq
+from app.rate_limit import INTERACTIVE, current_priority, estimate_request_tokens, get_scheduler
+
+load_dotenv()
+
+# Shared LLM clients keyed by their settings, reused across sessions and tenants
+_llm_pool = {}
+_llm_pool_lock = threading.Lock()
+
+
+def get_groq_api_key():
+    """
+    Get the Groq API key - try Streamlit secrets first, then environment
+    """
+    groq_api_key = None
+    try:
+        # For Streamlit Cloud deployment
+        groq_api_key = st.secrets["GROQ_API_KEY"]
+        print("✅ API key loaded from Streamlit secrets")
+    except:
+        # For local development
+        groq_api_key = os.getenv("GROQ_API_KEY")
+        print("✅ API key loaded from environment variables")
+
+    if not groq_api_key:
+        raise ValueError(
+            "GROQ_API_KEY not found. Please add it to Streamlit secrets or environment variables.\n"
+            "Get your API key from: https://console.groq.com/"
+        )
+    return groq_api_key
+
+
+def _prompt_text(messages):
+    return "\n".join(str(message.content) for message in messages)
+
+
+def _token_usage(result):
+    usage = (result.llm_output or {}).get("token_usage") or {}
+    return usage.get("total_tokens")
+
+
+class ScheduledChatGroq(ChatGroq):
+    """
+    ChatGroq whose calls wait for the model's rate limit scheduler, so bursts
+    are queued (interactive ahead of batch) instead of failing with 429s.
+    Retries are left to the scheduler rather than the HTTP client.
+    """
+
+    priority: int = INTERACTIVE
+
+    def _reserve(self, messages):
+        prompt = _prompt_text(messages)
+        return prompt, estimate_request_tokens(prompt, self.max_tokens), current_priority(self.priority)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        scheduler = get_scheduler(self.model_name)
+        _, reserved, priority = self._reserve(messages)
+        result = None
+        try:
+            result = scheduler.run(
+                lambda: super(ScheduledChatGroq, self)._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+                reserved,
+                priority
+            )
+            return result
+        finally:
+            scheduler.settle(reserved, _token_usage(result) if result is not None else None)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        from app.conversation import estimate_tokens
+
+        scheduler = get_scheduler(self.model_name)
+        prompt, reserved, priority = self._reserve(messages)
+
+        def start():
+            # Rate limits are reported before the first chunk, so only that is retried
+            chunks = super(ScheduledChatGroq, self)._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return chunks, next(chunks, None)
+
+        generated = []
+        try:
+            chunks, first = scheduler.run(start, reserved, priority)
+            if first is not None:
+                generated.append(first.text)
+                yield first
+                for chunk in chunks:
+                    generated.append(chunk.text)
+                    yield chunk
+        finally:
+            used = estimate_tokens(prompt) + estimate_tokens("".join(generated)) if generated else None
+            scheduler.settle(reserved, used)
+
+
+def create_groq_llm(model_name="llama3-70b-8192", temperature=0.1, max_tokens=1000, priority=INTERACTIVE):
+    """
+    Initialize a Groq chat model behind the rate limit scheduler
+
+    Args:
+        model_name: Name of the Groq model to use
+        temperature: Sampling temperature
+        max_tokens: Completion token limit
+        priority: Scheduler lane (INTERACTIVE or BATCH) unless llm_priority() overrides it
+    """
+    print(f"🔍 Initializing Groq model: {model_name}")
+    llm = ScheduledChatGroq(
+        api_key=get_groq_api_key(),
+        model_name=model_name,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        max_retries=0,
+        priority=priority
+    )
+    print("✅ Groq model initialized successfully")
+    return llm
+
+
+def get_groq_llm(model_name="llama3-70b-8192", temperature=0.1, max_tokens=1000, priority=INTERACTIVE):
+    """
+    Return the shared Groq client for these settings, creating it on first use
+    """
+    key = ("groq", model_name, temperature, max_tokens, priority)
+    with _llm_pool_lock:
+        if key not in _llm_pool:
+            _llm_pool[key] = create_groq_llm(model_name, temperature, max_tokens, priority)
+        return _llm_pool[key]
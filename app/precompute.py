@@ -0,0 +1,166 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from app.qa import normalize_query
+from app.rate_limit import BATCH, llm_priority
+
+# Questions offered as one-click buttons in the Streamlit UIs
+QUICK_QUESTIONS = [
+    "Summarize the main points",
+    "What are the key findings?",
+    "List important dates",
+    "Explain the methodology"
+]
+
+PRECOMPUTED_DIR = "precomputed"
+
+# (vector_store_path, index_version, model_name, config) of jobs currently running
+_running = set()
+_running_lock = threading.Lock()
+
+
+def canned_questions(sample_questions_path="sample_questions.txt", extra_questions=None):
+    """
+    Return the list of questions whose answers are precomputed after indexing
+
+    Args:
+        sample_questions_path: Text file with one question per line (optional)
+        extra_questions: Additional questions to include
+    """
+    questions = list(QUICK_QUESTIONS)
+    if sample_questions_path and os.path.exists(sample_questions_path):
+        with open(sample_questions_path, encoding="utf-8") as f:
+            questions.extend(line.strip() for line in f if line.strip())
+    questions.extend(extra_questions or [])
+
+    # Drop questions that normalize to the same key
+    seen = set()
+    unique = []
+    for question in questions:
+        key = normalize_query(question)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(question)
+    return unique
+
+
+def precomputed_path(vector_store_path, model_name, config=()):
+    """
+    Path of the precomputed answer file for one model and agent config
+    (retriever and answer-mode settings), stored with the index
+    """
+    safe_model = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+    if config:
+        safe_model += "-" + hashlib.sha1(repr(tuple(config)).encode("utf-8")).hexdigest()[:10]
+    return os.path.join(vector_store_path, PRECOMPUTED_DIR, f"{safe_model}.json")
+
+
+def load_precomputed(vector_store_path, index_version, model_name, config=()):
+    """
+    Load precomputed answers for the given index version, model and agent config.
+    Returns an empty dict when nothing matching has been computed yet.
+    """
+    path = precomputed_path(vector_store_path, model_name, config)
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("index_version") != index_version:
+        return {}
+    return data.get("answers", {})
+
+
+def _serialize_sources(documents):
+    return [
+        {"page_content": doc.page_content, "metadata": dict(doc.metadata)}
+        for doc in documents or []
+    ]
+
+
+def precompute_answers(agent, questions):
+    """
+    Run the canned questions through the agent and store the answers
+    next to the index, tagged with the index version they were computed for.
+
+    Answers already stored for this version are kept and not recomputed.
+    Summary questions are skipped until the version's summary tree has been
+    written, so they are never frozen as a top-k retrieval answer.
+    """
+    from app.summarizer import is_summary_question
+
+    answers = dict(load_precomputed(agent.vector_store_path, agent.index_version, agent.model_name, agent.config))
+    has_summary_tree = agent.summary_tree() is not None
+    for question in questions:
+        if normalize_query(question) in answers:
+            continue
+        if is_summary_question(question) and not has_summary_tree:
+            print(f"⏳ Summary tree not built yet, not precomputing: {question}")
+            continue
+        try:
+            response = agent.answer({"query": question})
+        except Exception as e:
+            print(f"⚠️ Precompute failed for '{question}': {e}")
+            continue
+        answers[normalize_query(question)] = {
+            "query": question,
+            "result": response["result"],
+            "source_documents": _serialize_sources(response.get("source_documents"))
+        }
+        print(f"✅ Precomputed answer for: {question}")
+
+    path = precomputed_path(agent.vector_store_path, agent.model_name, agent.config)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "index_version": agent.index_version,
+            "model_name": agent.model_name,
+            "config": list(agent.config),
+            "answers": answers
+        }, f)
+    os.replace(tmp_path, path)
+
+    print(f"✅ Stored {len(answers)} precomputed answer(s) for index {agent.index_version}")
+    return answers
+
+
+def start_background_precompute(agent, questions=None):
+    """
+    Precompute canned answers in a daemon thread unless they already exist for
+    the agent's index version, or another session is already computing them.
+
+    Returns:
+        The started thread, or None if nothing needed to run
+    """
+    questions = questions if questions is not None else canned_questions()
+    if not questions:
+        return None
+
+    existing = load_precomputed(agent.vector_store_path, agent.index_version, agent.model_name, agent.config)
+    if all(normalize_query(q) in existing for q in questions):
+        return None
+
+    job_key = (os.path.abspath(agent.vector_store_path), agent.index_version, agent.model_name, agent.config)
+    with _running_lock:
+        if job_key in _running:
+            return None
+        _running.add(job_key)
+
+    def run():
+        try:
+            # Canned answers wait behind users' questions for the rate limit
+            with llm_priority(BATCH):
+                precompute_answers(agent, questions)
+        except Exception as e:
+            print(f"❌ Background precompute failed: {e}")
+        finally:
+            with _running_lock:
+                _running.discard(job_key)
+
+    thread = threading.Thread(target=run, name="precompute-answers", daemon=True)
+    thread.start()
+    print(f"🔄 Precomputing {len(questions)} canned answer(s) in the background")
+    return thread
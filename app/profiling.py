@@ -0,0 +1,222 @@
+import os
+import sys
+import time
+import weakref
+import threading
+import contextlib
+import tracemalloc
+from collections import Counter, deque
+
+PROFILES_DIR = os.path.join(".cache", "profiles")
+
+# Stack sampling interval while profiling, RSS sampling interval otherwise
+CPU_SAMPLE_INTERVAL = 0.005
+RSS_SAMPLE_INTERVAL = 0.05
+
+# Allocation sites and stacks kept per profiled stage
+TOP_ALLOCATIONS = 10
+TOP_STACKS = 5
+
+_enabled = os.getenv("PROFILING", "0") == "1"
+_recent = deque(maxlen=20)
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def set_profiling(enabled):
+    """Turn CPU sampling and allocation tracing on or off for stages started from now on"""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def profiling_enabled():
+    return _enabled
+
+
+def recent_profiles():
+    """Most recent profiled stages, newest first"""
+    return list(reversed(_recent))
+
+
+def current_rss_bytes():
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # Peak rather than current outside Linux; kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class _Sampler:
+    """
+    Background thread sampling process RSS and, when profiling, the call
+    stack of one target thread. Holds no reference to its StageProfiler, so
+    an abandoned profiler stops its sampler when garbage collected.
+    """
+
+    def __init__(self, thread_id, sample_stacks):
+        self.thread_id = thread_id
+        self.sample_stacks = sample_stacks
+        self.interval = CPU_SAMPLE_INTERVAL if sample_stacks else RSS_SAMPLE_INTERVAL
+        self.stacks = Counter()
+        self.samples = 0
+        self.rss_start = current_rss_bytes()
+        self.rss_peak = self.rss_start
+        self.stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.rss_peak = max(self.rss_peak, current_rss_bytes())
+            if not self.sample_stacks:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def stop(self):
+        self.stop_event.set()
+        self._thread.join()
+        self.rss_peak = max(self.rss_peak, current_rss_bytes())
+
+
+def _start_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+    return tracemalloc.take_snapshot()
+
+
+def _stop_tracemalloc(before):
+    global _tracemalloc_users
+    after = tracemalloc.take_snapshot()
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0:
+            tracemalloc.stop()
+    return [
+        {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_kb": round(stat.size_diff / 1024, 1),
+            "count": stat.count_diff
+        }
+        for stat in after.compare_to(before, "lineno")[:TOP_ALLOCATIONS]
+    ]
+
+
+def _write_collapsed(name, stage, stacks):
+    """Write stacks in collapsed format ("a;b;c count"), readable by flamegraph.pl and speedscope"""
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    path = os.path.join(PROFILES_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{stage}.collapsed")
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+class StageProfiler:
+    """
+    Profiles consecutive named stages of one operation, such as an index
+    build. Peak RSS and wall time are always recorded; with profiling
+    enabled each stage also gets a sampled CPU profile (collapsed stacks
+    written under PROFILES_DIR) and its top tracemalloc allocation sites.
+
+    Usage:
+        profiler = StageProfiler("ingest")
+        profiler.stage("extract")
+        ...
+        profiler.stage("embed")
+        ...
+        stages = profiler.finish()
+
+    or, for a single stage, `with StageProfiler("query"): ...`
+    """
+
+    def __init__(self, name, profile=None):
+        self.name = name
+        self.profile = profiling_enabled() if profile is None else profile
+        self.stages = {}
+        self._current = None
+        self._started = None
+        self._sampler = None
+        self._snapshot = None
+        self._finalizer = None
+
+    def stage(self, stage):
+        """End the current stage (if any) and start `stage`; repeated calls for the same stage are ignored"""
+        if stage == self._current:
+            return
+        self._end()
+        self._current = stage
+        self._started = time.perf_counter()
+        self._sampler = _Sampler(threading.get_ident(), self.profile)
+        self._finalizer = weakref.finalize(self, self._sampler.stop_event.set)
+        if self.profile:
+            self._snapshot = _start_tracemalloc()
+
+    def _end(self):
+        if self._current is None:
+            return
+        seconds = time.perf_counter() - self._started
+        self._sampler.stop()
+        self._finalizer.detach()
+        result = {
+            "seconds": round(seconds, 3),
+            "rss_start_mb": round(self._sampler.rss_start / 1024 / 1024, 1),
+            "peak_rss_mb": round(self._sampler.rss_peak / 1024 / 1024, 1)
+        }
+        if self.profile:
+            result["top_allocations"] = _stop_tracemalloc(self._snapshot)
+            result["samples"] = self._sampler.samples
+            if self._sampler.stacks:
+                result["collapsed_stacks"] = _write_collapsed(self.name, self._current, self._sampler.stacks)
+                result["top_stacks"] = [
+                    {"stack": stack.split(";")[-1], "samples": count}
+                    for stack, count in self._sampler.stacks.most_common(TOP_STACKS)
+                ]
+            _recent.append({"name": self.name, "stage": self._current, "time": time.time(), **result})
+            print(f"⏱️ Profiled {self.name}/{self._current}: {result['seconds']}s, peak RSS {result['peak_rss_mb']} MB")
+
+        self.stages[self._current] = result
+        self._current = None
+        self._sampler = None
+        self._snapshot = None
+
+    def finish(self):
+        """End the current stage and return {stage: measurements}"""
+        self._end()
+        return self.stages
+
+    def __enter__(self):
+        self.stage(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.finish()
+
+
+def profiled(name):
+    """Profile a block as a single stage when profiling is enabled, else do nothing"""
+    if not profiling_enabled():
+        return contextlib.nullcontext()
+    return StageProfiler(name)
@@ -0,0 +1,76 @@
+import os
+import threading
+from langchain.chains import LLMChain, RetrievalQA
+from langchain.chains.combine_documents.stuff import StuffDocumentsChain
+from langchain.prompts import PromptTemplate
+
+SYSTEM_PROMPT_PATH = os.path.join(os.path.dirname(__file__), "prompts", "insurance_prompt.txt")
+
+# The static instructions come first and the question last, so consecutive
+# prompts share the longest possible prefix for provider-side prompt caching
+QA_TEMPLATE = """{system_prompt}
+If the answer is not in the context, say that the documents do not cover it.
+
+Context:
+{{context}}
+
+Question: {{question}}
+Answer:"""
+
+_qa_prompt = None
+_qa_prompt_lock = threading.Lock()
+
+
+def get_qa_prompt():
+    """QA prompt compiled once per process from the system prompt file"""
+    global _qa_prompt
+    with _qa_prompt_lock:
+        if _qa_prompt is None:
+            with open(SYSTEM_PROMPT_PATH, encoding="utf-8") as f:
+                system_prompt = f.read().strip()
+            _qa_prompt = PromptTemplate(
+                input_variables=["context", "question"],
+                template=QA_TEMPLATE.format(system_prompt=system_prompt)
+            )
+        return _qa_prompt
+
+
+def order_documents(documents):
+    """Chunks in a deterministic (source_file, page) order, independent of retrieval rank"""
+    return sorted(
+        documents,
+        key=lambda doc: (
+            str(doc.metadata.get("source_file") or doc.metadata.get("source") or ""),
+            doc.metadata.get("page") if isinstance(doc.metadata.get("page"), int) else -1,
+            doc.page_content
+        )
+    )
+
+
+class OrderedStuffDocumentsChain(StuffDocumentsChain):
+    """"Stuff" chain that lays out the retrieved chunks in document order"""
+
+    def _get_inputs(self, docs, **kwargs):
+        return super()._get_inputs(order_documents(docs), **kwargs)
+
+
+def build_qa_chain(llm, retriever, verbose=False):
+    """
+    RetrievalQA chain using the insurance system prompt and a stable chunk order
+
+    Args:
+        llm: Chat model or LLM
+        retriever: Retriever returning the chunks for a question
+        verbose: Log chain steps
+    """
+    combine_documents_chain = OrderedStuffDocumentsChain(
+        llm_chain=LLMChain(llm=llm, prompt=get_qa_prompt(), verbose=verbose),
+        document_variable_name="context",
+        verbose=verbose
+    )
+    return RetrievalQA(
+        combine_documents_chain=combine_documents_chain,
+        retriever=retriever,
+        return_source_documents=True,
+        verbose=verbose
+    )
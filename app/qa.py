@@ -0,0 +1,303 @@
+import os
+import re
+import time
+from langchain.schema import Document
+from app.singleflight import SingleFlight
+
+# Process-wide, so sessions that each hold their own agent still share calls
+_inflight = SingleFlight()
+
+
+def normalize_query(query):
+    """
+    Normalize a question so trivially different spellings share one cache/flight key
+    """
+    query = re.sub(r"\s+", " ", (query or "").strip().lower())
+    return query.rstrip("?.! ")
+
+
+def index_version(vector_store_path="vectorstore"):
+    """
+    Return an identifier that changes whenever the index at vector_store_path is rebuilt
+    """
+    index_file = os.path.join(vector_store_path, "index.faiss")
+    if not os.path.exists(index_file):
+        return "missing"
+    stat = os.stat(index_file)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+class QAAgent:
+    """
+    Question answering front for a RetrievalQA chain.
+
+    Questions with a precomputed answer for the loaded index version are served
+    from disk, rule lookups (entry age, waiting period, sum assured, exclusions)
+    are answered from the structured rule store when a rule matches, and summary
+    questions are answered from the precomputed summary tree when one exists.
+    With a RelevanceGate, questions whose best chunk falls below the relevance
+    threshold get a "not covered" answer with the closest sources and no LLM call.
+    With a QueryRouter, other lookup-style questions are answered extractively
+    from the retrieved chunks without an LLM call. Concurrent questions with the same normalized text against the
+    same index version, model and config (retriever and answer-mode settings) are coalesced into one retrieval
+    and one LLM call.
+    """
+
+    def __init__(self, chain, index_version, model_name, vector_store_path="vectorstore", llm=None, router=None,
+                 relevance_gate=None, config=()):
+        self.chain = chain
+        self.router = router
+        self.relevance_gate = relevance_gate
+        self.index_version = index_version
+        self.model_name = model_name
+        self.vector_store_path = vector_store_path
+        self.llm = llm
+        # Hashable settings that change answers; agents differing in them never share an in-flight call
+        self.config = tuple(config)
+        self._precomputed = {}
+        self._precomputed_mtime = None
+        self._summary_tree = None
+        self._summary_tree_mtime = None
+        self._rule_index = None
+        self._rule_index_mtime = None
+
+    def precomputed_answers(self):
+        """Precomputed answers for this index version and config, reloaded when the file changes"""
+        from app.precompute import load_precomputed, precomputed_path
+
+        path = precomputed_path(self.vector_store_path, self.model_name, self.config)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return {}
+        if mtime != self._precomputed_mtime:
+            self._precomputed = load_precomputed(self.vector_store_path, self.index_version, self.model_name,
+                                                 self.config)
+            self._precomputed_mtime = mtime
+        return self._precomputed
+
+    def summary_tree(self):
+        """Summary tree built for this index version, or None"""
+        from app.summarizer import SUMMARY_TREE_FILE, load_summary_tree
+
+        try:
+            mtime = os.stat(os.path.join(self.vector_store_path, SUMMARY_TREE_FILE)).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._summary_tree_mtime:
+            self._summary_tree = load_summary_tree(self.vector_store_path, self.index_version)
+            self._summary_tree_mtime = mtime
+        return self._summary_tree
+
+    def rule_index(self):
+        """Structured rule store of this index version, or None"""
+        from app.rules import RULES_FILE, load_rule_index
+
+        try:
+            mtime = os.stat(os.path.join(self.vector_store_path, RULES_FILE)).st_mtime_ns
+        except OSError:
+            return None
+        if mtime != self._rule_index_mtime:
+            self._rule_index = load_rule_index(self.vector_store_path)
+            self._rule_index_mtime = mtime
+        return self._rule_index
+
+    def rule_answer(self, query):
+        """Response for a rule lookup question answered from the rule store, or None"""
+        rules = self.rule_index()
+        if rules is None:
+            return None
+        try:
+            response = rules.answer(query)
+        except Exception as e:
+            print(f"⚠️ Rule lookup failed, using retrieval: {e}")
+            return None
+        if response:
+            print(f"📏 Answered from rule index: {query}")
+            response["query"] = query
+        return response
+
+    def answer(self, inputs, **kwargs):
+        """Compute an answer without consulting the precomputed answers"""
+        from app.summarizer import is_summary_question, answer_from_summary_tree
+
+        query = inputs["query"]
+        if self.llm is not None and is_summary_question(query):
+            tree = self.summary_tree()
+            if tree and tree.get("documents"):
+                print(f"📝 Answering from summary tree: {query}")
+                return answer_from_summary_tree(self.llm, tree, query)
+
+        not_covered = self.relevance_check(query)
+        if not_covered:
+            return not_covered
+
+        if self.router is not None:
+            return self.routed_answer(inputs, **kwargs)
+        return self.chain.invoke(inputs, **kwargs)
+
+    def relevance_check(self, query):
+        """"Not covered" response when nothing retrieved is relevant enough to the question, else None"""
+        from app.embeddings import get_embeddings
+        from app.relevance import not_covered_response
+        from app.summarizer import is_summary_question
+
+        # Summary questions are about the documents as a whole, not any one chunk
+        if self.relevance_gate is None or is_summary_question(query):
+            return None
+        try:
+            covered, best, documents = self.relevance_gate.check(
+                self.chain.retriever, get_embeddings().embed_query(query)
+            )
+        except Exception as e:
+            print(f"⚠️ Relevance check failed, answering anyway: {e}")
+            return None
+        if covered:
+            return None
+        print(f"🚫 Not covered by the documents (best similarity {best:.2f}): {query}")
+        return not_covered_response(query, documents, best)
+
+    def routed_answer(self, inputs, **kwargs):
+        """
+        Route lookup questions to the extractive mode (top retrieved sentences
+        with page citations, no LLM) and everything else to the chain
+        """
+        from app.embeddings import get_embeddings
+        from app.router import EXTRACTIVE, extractive_answer
+
+        query = inputs["query"]
+        start = time.perf_counter()
+        embeddings = get_embeddings()
+        query_vector = embeddings.embed_query(query)
+        label, scores = self.router.classify(query_vector)
+
+        if label == EXTRACTIVE:
+            documents = self.chain.retriever.invoke(query)
+            extracted = extractive_answer(embeddings, query_vector, documents)
+            if extracted:
+                result, cited = extracted
+                self.router.log(query, label, scores, EXTRACTIVE, time.perf_counter() - start)
+                return {"query": query, "result": result, "source_documents": cited, "extractive": True}
+            # No sentence close enough; generate from the chunks already retrieved
+            response = {
+                "query": query,
+                "result": self.chain.combine_documents_chain.invoke(
+                    {"input_documents": documents, "question": query}
+                )["output_text"],
+                "source_documents": documents
+            }
+        else:
+            response = self.chain.invoke(inputs, **kwargs)
+
+        seconds = time.perf_counter() - start
+        self.router.record_llm_latency(seconds)
+        self.router.log(query, label, scores, "llm", seconds)
+        return response
+
+    def invoke(self, inputs, **kwargs):
+        query = inputs["query"]
+        normalized = normalize_query(query)
+
+        cached = self.precomputed_answers().get(normalized)
+        if cached:
+            print(f"⚡ Served precomputed answer for: {query}")
+            return {
+                "query": query,
+                "result": cached["result"],
+                "source_documents": [Document(**doc) for doc in cached["source_documents"]],
+                "precomputed": True
+            }
+
+        rule_response = self.rule_answer(query)
+        if rule_response:
+            return rule_response
+
+        # Summary questions are not precomputed before the summary tree exists;
+        # once it does, fill in their precomputed answers in the background
+        if self.llm is not None and self.summary_tree() is not None:
+            from app.summarizer import is_summary_question
+
+            if is_summary_question(query):
+                from app.precompute import start_background_precompute
+                start_background_precompute(self)
+
+        key = (self.index_version, self.model_name, self.config, normalized)
+
+        result, shared = _inflight.do(key, lambda: self.answer(inputs, **kwargs))
+
+        # Every caller gets its own copy so one session cannot mutate another's answer
+        response = dict(result)
+        response["query"] = query
+        if shared:
+            print(f"🔁 Coalesced duplicate question: {query}")
+        return response
+
+    def stream(self, query):
+        """
+        Answer a question incrementally, for clients that render tokens as they arrive.
+        Precomputed, rule, summary-tree and "not covered" answers are returned as a single chunk.
+
+        Returns:
+            (source_documents, iterator over answer text chunks)
+        """
+        from app.summarizer import is_summary_question
+
+        cached = self.precomputed_answers().get(normalize_query(query)) or self.rule_answer(query)
+        if cached or self.llm is None or is_summary_question(query):
+            response = self.invoke({"query": query})
+            return response.get("source_documents") or [], iter([response["result"]])
+
+        not_covered = self.relevance_check(query)
+        if not_covered:
+            return not_covered["source_documents"], iter([not_covered["result"]])
+
+        documents = self.chain.retriever.invoke(query)
+        combine_chain = self.chain.combine_documents_chain
+        # Same prompt the "stuff" chain would send, built from the same documents
+        prompt = combine_chain.llm_chain.prompt.format(**combine_chain._get_inputs(documents, question=query))
+
+        def tokens():
+            for chunk in self.llm.stream(prompt):
+                yield getattr(chunk, "content", chunk)
+
+        return documents, tokens()
+
+    def ask(self, query, memory=None):
+        """
+        Answer a chat question. With a ConversationMemory, follow-ups are
+        condensed into a standalone question using a bounded history, and the
+        previous turn's chunks are reused when the follow-up stays on them.
+        """
+        from app.conversation import condense_question, should_reuse_context
+        from app.embeddings import get_embeddings
+
+        if memory is None or self.llm is None:
+            return self.invoke({"query": query})
+
+        standalone = condense_question(self.llm, memory, query)
+        question_vector = get_embeddings().embed_query(standalone)
+
+        index = (os.path.abspath(self.vector_store_path), self.index_version)
+        if should_reuse_context(memory, question_vector, index):
+            print(f"♻️ Reusing previous turn's context for: {standalone}")
+            documents = memory.last_documents
+            result = self.chain.combine_documents_chain.invoke(
+                {"input_documents": documents, "question": standalone}
+            )["output_text"]
+            response = {"result": result, "source_documents": documents, "reused_context": True}
+        else:
+            response = self.invoke({"query": standalone})
+            response["reused_context"] = False
+
+        response["query"] = query
+        response["standalone_query"] = standalone
+        memory.last_question_vector = question_vector
+        memory.last_documents = list(response.get("source_documents") or [])
+        memory.last_index = index
+        memory.add_turn(query, response["result"])
+        return response
+
+    def __getattr__(self, name):
+        if name == "chain":
+            raise AttributeError(name)
+        return getattr(self.chain, name)
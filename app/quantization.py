@@ -0,0 +1,91 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Vector storage options for the FAISS index
+VECTOR_STORAGE_OPTIONS = ("float32", "fp16", "int8")
+
+# Full-precision copy of the vectors, written next to compact indexes for rescoring
+FULL_VECTORS_FILE = "vectors.f32.npy"
+
+# Memory-mapped vector files kept open per process, least recently used first.
+# A mapping keeps its file's inode alive, so entries of collected versions are
+# dropped and the total is bounded; agents still using an evicted mapping keep it.
+MAX_OPEN_MEMMAPS = int(os.getenv("MAX_OPEN_MEMMAPS", "8"))
+
+_memmaps = OrderedDict()
+_memmaps_lock = threading.Lock()
+
+
+def compress_index(vectors, storage="fp16"):
+    """
+    Build a scalar-quantized FAISS index (L2, like the default flat index)
+
+    Args:
+        vectors: (n, d) float32 array
+        storage: 'fp16' (2 bytes/dim) or 'int8' (1 byte/dim)
+    """
+    import faiss
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    quantizer_types = {
+        "fp16": faiss.ScalarQuantizer.QT_fp16,
+        "int8": faiss.ScalarQuantizer.QT_8bit
+    }
+    if storage not in quantizer_types:
+        raise ValueError(f"Unsupported vector storage: {storage}. Use one of {VECTOR_STORAGE_OPTIONS}")
+
+    index = faiss.IndexScalarQuantizer(vectors.shape[1], quantizer_types[storage], faiss.METRIC_L2)
+    # int8 learns per-dimension ranges; fp16 needs no training but train() is harmless
+    index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def index_bytes_per_vector(index):
+    """Bytes a FAISS index keeps in memory per vector"""
+    try:
+        return index.sa_code_size()
+    except Exception:
+        return index.d * 4
+
+
+def save_full_vectors(vectors, directory):
+    """Write the float32 vectors as an .npy file that can be memory-mapped"""
+    path = os.path.join(directory, FULL_VECTORS_FILE)
+    np.save(path, np.ascontiguousarray(vectors, dtype=np.float32))
+    return path
+
+
+def load_full_vectors(directory):
+    """Memory-mapped full-precision vectors of an index, or None if not stored"""
+    path = os.path.abspath(os.path.join(directory, FULL_VECTORS_FILE))
+    if not os.path.exists(path):
+        return None
+    with _memmaps_lock:
+        for cached_path in [p for p in _memmaps if not os.path.exists(p)]:
+            del _memmaps[cached_path]
+        if path in _memmaps:
+            _memmaps.move_to_end(path)
+        else:
+            _memmaps[path] = np.load(path, mmap_mode="r")
+            while len(_memmaps) > MAX_OPEN_MEMMAPS:
+                _memmaps.popitem(last=False)
+        return _memmaps[path]
+
+
+def rescore(query_vector, full_vectors, candidate_ids, k):
+    """
+    Re-rank candidate ids by exact L2 distance against full-precision vectors
+
+    Returns:
+        (ids, distances) of the k nearest candidates
+    """
+    candidate_ids = np.asarray(candidate_ids, dtype=np.int64)
+    # Sorted fancy indexing keeps memory-mapped reads sequential
+    order = np.argsort(candidate_ids)
+    candidates = np.asarray(full_vectors[candidate_ids[order]], dtype=np.float32)
+    distances = ((candidates - query_vector[None, :]) ** 2).sum(axis=1)
+    best = np.argsort(distances)[:k]
+    return candidate_ids[order][best], distances[best]
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import heapq
+import random
+import itertools
+import threading
+import contextlib
+import contextvars
+
+# Priority lanes: lower values are served first
+INTERACTIVE = 0
+BATCH = 1
+
+# (requests per minute, tokens per minute) of each model offered in the UI,
+# overridable with GROQ_RATE_LIMITS='{"model": [rpm, tpm]}' for paid tiers
+GROQ_RATE_LIMITS = {
+    "llama3-70b-8192": (30, 6000),
+    "gemma2-9b-it": (30, 15000),
+    "qwen/qwen-2.5-72b-instruct": (30, 6000),
+    "deepseek-r1-distill-llama-70b": (30, 6000),
+    "llama-3.1-70b-versatile": (30, 6000),
+}
+DEFAULT_RATE_LIMIT = (30, 6000)
+
+# Share of each limit the scheduler plans to use. The buckets refill at this
+# rate and only hold the remaining share as burst, so any 60s window stays
+# under the provider limit instead of bursting into 429s and backing off
+RATE_LIMIT_HEADROOM = float(os.getenv("GROQ_RATE_LIMIT_HEADROOM", "0.9"))
+
+# Retries of a rate-limited call, with full-jitter exponential backoff
+MAX_RETRIES = 4
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+
+# Longest a waiter sleeps before re-checking the queue
+MAX_WAIT_SECONDS = 1.0
+
+_priority = contextvars.ContextVar("llm_priority", default=None)
+
+
+def _configured_limits():
+    limits = dict(GROQ_RATE_LIMITS)
+    override = os.getenv("GROQ_RATE_LIMITS")
+    if override:
+        try:
+            limits.update({model: tuple(value) for model, value in json.loads(override).items()})
+        except (ValueError, TypeError, AttributeError):
+            print("⚠️ Ignoring malformed GROQ_RATE_LIMITS")
+    return limits
+
+
+@contextlib.contextmanager
+def llm_priority(priority):
+    """Run LLM calls made by this thread inside the block in the given lane"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority(default=INTERACTIVE):
+    """Lane set by llm_priority() for this thread, else default"""
+    priority = _priority.get()
+    return default if priority is None else priority
+
+
+def estimate_request_tokens(prompt_text, max_tokens):
+    """Tokens a request may use: the prompt (~4 characters per token) plus the full completion limit"""
+    from app.conversation import estimate_tokens
+
+    return estimate_tokens(prompt_text) + (max_tokens or 0)
+
+
+def is_rate_limit_error(error):
+    """True for an HTTP 429 from the provider, however the client wraps it"""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    name = type(error).__name__
+    return name == "RateLimitError" or "rate limit" in str(error).lower()
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Refills at `rate` units per second up to `capacity`. A request larger than
+    the capacity is admitted once the bucket is full and leaves it in debt,
+    so the long-run rate never exceeds `rate`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` can be taken (0 if it can be taken now)"""
+        self._refill(now)
+        needed = min(amount, self.capacity) - self.level
+        return max(0.0, needed / self.rate)
+
+    def take(self, amount):
+        self.level -= amount
+
+    def give(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+    def drain(self, seconds, now):
+        """Empty the bucket so nothing is admitted for `seconds`"""
+        self._refill(now)
+        self.level = min(self.level, -seconds * self.rate)
+
+
+class ModelScheduler:
+    """
+    Admission queue for one model: requests wait in (priority, arrival)
+    order and the head is admitted when both the request and the token
+    bucket can cover it.
+    """
+
+    def __init__(self, model_name, requests_per_minute, tokens_per_minute, headroom=RATE_LIMIT_HEADROOM):
+        self.model_name = model_name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = TokenBucket(
+            requests_per_minute * headroom / 60, max(1.0, requests_per_minute * (1 - headroom))
+        )
+        self.tokens = TokenBucket(
+            tokens_per_minute * headroom / 60, max(1.0, tokens_per_minute * (1 - headroom))
+        )
+        self._cond = threading.Condition()
+        self._queue = []
+        self._sequence = itertools.count()
+        self._stats = {"admitted": 0, "rate_limited": 0, "retries": 0, "waited_seconds": 0.0,
+                       "tokens_reserved": 0, "tokens_used": 0}
+
+    def acquire(self, tokens, priority=INTERACTIVE):
+        """Block until a request estimated at `tokens` may be sent"""
+        started = time.monotonic()
+        entry = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] == entry:
+                        now = time.monotonic()
+                        wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                        if wait == 0:
+                            heapq.heappop(self._queue)
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            self._stats["admitted"] += 1
+                            self._stats["tokens_reserved"] += tokens
+                            self._stats["waited_seconds"] += time.monotonic() - started
+                            return
+                    self._cond.wait(min(wait, MAX_WAIT_SECONDS) if wait else MAX_WAIT_SECONDS)
+            finally:
+                if entry in self._queue:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+    def settle(self, reserved, used):
+        """Correct a reservation with the tokens the request actually used"""
+        with self._cond:
+            if used is not None:
+                self._stats["tokens_used"] += used
+                if used < reserved:
+                    self.tokens.give(reserved - used)
+                else:
+                    self.tokens.take(used - reserved)
+            self._cond.notify_all()
+
+    def rate_limited(self, error, attempt):
+        """
+        Record a 429 and return how long to back off. The buckets are drained
+        for that long, so queued requests wait too instead of piling on.
+        """
+        backoff = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            backoff += retry_after
+        with self._cond:
+            self._stats["rate_limited"] += 1
+            now = time.monotonic()
+            self.requests.drain(backoff, now)
+            self.tokens.drain(backoff, now)
+        return backoff
+
+    def run(self, fn, tokens, priority=INTERACTIVE):
+        """
+        Call fn() once admitted, retrying with jittered backoff on rate limits
+
+        Returns:
+            fn()'s result; settle() the reservation with the actual usage afterwards
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            self.acquire(tokens, priority)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt == MAX_RETRIES:
+                    raise
+                backoff = self.rate_limited(e, attempt)
+                with self._cond:
+                    self._stats["retries"] += 1
+                print(f"⏳ {self.model_name} rate limited, retrying in {backoff:.1f}s")
+                time.sleep(backoff)
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self.requests._refill(now)
+            self.tokens._refill(now)
+            return {
+                "limits": {"rpm": self.requests_per_minute, "tpm": self.tokens_per_minute},
+                "queued": len(self._queue),
+                "queued_batch": sum(1 for priority, _ in self._queue if priority >= BATCH),
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": round(self.tokens.level),
+                **{key: round(value, 2) if isinstance(value, float) else value
+                   for key, value in self._stats.items()}
+            }
+
+
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(model_name):
+    """Process-wide scheduler holding the rate limit view of one model"""
+    with _schedulers_lock:
+        if model_name not in _schedulers:
+            rpm, tpm = _configured_limits().get(model_name, DEFAULT_RATE_LIMIT)
+            _schedulers[model_name] = ModelScheduler(model_name, rpm, tpm)
+        return _schedulers[model_name]
+
+
+def scheduler_stats():
+    """{model: stats} of every model used so far"""
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {model: scheduler.stats() for model, scheduler in schedulers.items()}
@@ -0,0 +1,217 @@
+"""
+Relevance gate: questions whose best retrieved chunk is not similar enough
+to the question are answered "not covered" without an LLM call.
+
+The threshold is calibrated from a labelled question set (JSONL lines of
+{"question": "...", "answerable": true/false}) against a published index:
+
+    python -m app.relevance questions.jsonl --vector-store vectorstore
+"""
+import os
+import json
+import math
+import time
+import argparse
+import threading
+
+CALIBRATION_PATH = os.path.join(".cache", "relevance_threshold.json")
+
+# Best-chunk cosine similarity below which a question counts as not covered.
+# Uncalibrated MiniLM default: in-scope questions usually score above 0.4,
+# unrelated ones below 0.2. RELEVANCE_THRESHOLD overrides both this and the calibration
+DEFAULT_RELEVANCE_THRESHOLD = 0.25
+
+# Share of answerable calibration questions that must pass the gate
+TARGET_RECALL = 0.95
+
+# Closest chunks returned as sources with a "not covered" answer
+CLOSEST_SOURCES = 3
+
+NOT_COVERED_MESSAGE = (
+    "The uploaded documents do not appear to cover this question. "
+    "The closest passages found are listed as sources."
+)
+
+_gate = None
+_gate_lock = threading.Lock()
+
+
+def load_calibration(path=CALIBRATION_PATH):
+    """Stored calibration result, or None"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def best_similarities(vectorstore, query_vector, n=CLOSEST_SOURCES, full_vectors=None):
+    """
+    Returns:
+        (documents, similarities) of the n chunks closest to the query, best first
+    """
+    from app.retrieval import _docs_for_ids, scored_search
+
+    ids, similarities = scored_search(vectorstore, query_vector, n, full_vectors)
+    return _docs_for_ids(vectorstore, ids), [float(score) for score in similarities]
+
+
+class RelevanceGate:
+    """
+    Decides whether a question is covered by the index from the similarity of
+    its best chunk. The threshold comes from RELEVANCE_THRESHOLD, else the
+    calibration file (reloaded when it changes), else the default.
+    """
+
+    def __init__(self, calibration_path=CALIBRATION_PATH):
+        self.calibration_path = calibration_path
+        self._threshold = DEFAULT_RELEVANCE_THRESHOLD
+        self._calibration_mtime = None
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.not_covered = 0
+
+    @property
+    def threshold(self):
+        override = os.getenv("RELEVANCE_THRESHOLD")
+        if override:
+            return float(override)
+        try:
+            mtime = os.stat(self.calibration_path).st_mtime_ns
+        except OSError:
+            return DEFAULT_RELEVANCE_THRESHOLD
+        with self._lock:
+            if mtime != self._calibration_mtime:
+                calibration = load_calibration(self.calibration_path) or {}
+                self._threshold = calibration.get("threshold", DEFAULT_RELEVANCE_THRESHOLD)
+                self._calibration_mtime = mtime
+            return self._threshold
+
+    def check(self, retriever, query_vector):
+        """
+        Returns:
+            (covered, best similarity, closest documents)
+        """
+        documents, similarities = best_similarities(
+            retriever.vectorstore, query_vector, full_vectors=getattr(retriever, "full_vectors", None)
+        )
+        best = similarities[0] if similarities else 0.0
+        covered = best >= self.threshold
+        with self._lock:
+            self.checked += 1
+            if not covered:
+                self.not_covered += 1
+        return covered, best, documents
+
+    def stats(self):
+        return {"threshold": round(self.threshold, 3), "checked": self.checked, "not_covered": self.not_covered}
+
+
+def get_relevance_gate():
+    """Process-wide relevance gate"""
+    global _gate
+    with _gate_lock:
+        if _gate is None:
+            _gate = RelevanceGate()
+        return _gate
+
+
+def not_covered_response(query, documents, best_similarity):
+    return {
+        "query": query,
+        "result": NOT_COVERED_MESSAGE,
+        "source_documents": documents,
+        "not_covered": True,
+        "relevance": round(best_similarity, 3)
+    }
+
+
+def choose_threshold(answerable_scores, unanswerable_scores, target_recall=TARGET_RECALL):
+    """
+    Highest threshold that still lets target_recall of the answerable
+    questions through, so the gate rejects as many unanswerable questions as
+    possible without turning away covered ones.
+
+    Returns:
+        (threshold, metrics)
+    """
+    if not answerable_scores:
+        raise ValueError("Calibration needs at least one answerable question")
+    ranked = sorted(answerable_scores, reverse=True)
+    keep = max(1, min(len(ranked), math.ceil(target_recall * len(ranked))))
+    threshold = ranked[keep - 1]
+    # Sit halfway to the closest unanswerable score below, to leave a margin on both sides
+    below = [score for score in unanswerable_scores if score < threshold]
+    if below:
+        threshold = (threshold + max(below)) / 2
+
+    passed = sum(score >= threshold for score in answerable_scores)
+    rejected = sum(score < threshold for score in unanswerable_scores)
+    return threshold, {
+        "answerable": len(answerable_scores),
+        "unanswerable": len(unanswerable_scores),
+        "recall": round(passed / len(answerable_scores), 3),
+        "rejection_rate": round(rejected / len(unanswerable_scores), 3) if unanswerable_scores else None
+    }
+
+
+def calibrate(questions_path, vector_store_path="vectorstore", target_recall=TARGET_RECALL,
+              output_path=CALIBRATION_PATH):
+    """
+    Score a labelled question set against the current index and store the chosen threshold
+
+    Returns:
+        The calibration record
+    """
+    from app.embeddings import EMBEDDING_MODEL, get_embeddings
+    from app.index_store import IndexStore
+    from app.quantization import load_full_vectors
+    from app.tenants import load_vectorstore
+
+    with open(questions_path, encoding="utf-8") as f:
+        labelled = [json.loads(line) for line in f if line.strip()]
+
+    embeddings = get_embeddings()
+    answerable, unanswerable = [], []
+    with IndexStore(vector_store_path).acquire() as lease:
+        db = load_vectorstore(lease.path, mmap=True)
+        full_vectors = load_full_vectors(lease.path)
+        vectors = embeddings.embed_documents([item["question"] for item in labelled])
+        for item, vector in zip(labelled, vectors):
+            _, similarities = best_similarities(db, vector, n=1, full_vectors=full_vectors)
+            score = similarities[0] if similarities else 0.0
+            (answerable if item["answerable"] else unanswerable).append(score)
+        version = lease.version
+
+    threshold, metrics = choose_threshold(answerable, unanswerable, target_recall)
+    calibration = {
+        "threshold": threshold,
+        "target_recall": target_recall,
+        "embedding_model": EMBEDDING_MODEL,
+        "index_version": version,
+        "created": time.time(),
+        **metrics
+    }
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=1)
+
+    print(f"🎯 Relevance threshold {threshold:.3f}: {metrics['recall']:.0%} of answerable questions pass"
+          + (f", {metrics['rejection_rate']:.0%} of unanswerable ones are rejected"
+             if metrics["rejection_rate"] is not None else ""))
+    return calibration
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the relevance gate threshold from labelled questions")
+    parser.add_argument("questions", help='JSONL of {"question": ..., "answerable": true/false}')
+    parser.add_argument("--vector-store", default="vectorstore", help="Index store root")
+    parser.add_argument("--target-recall", type=float, default=TARGET_RECALL,
+                        help="Share of answerable questions that must pass the gate")
+    parser.add_argument("--output", default=CALIBRATION_PATH, help="Calibration file read by the gate")
+    args = parser.parse_args(argv)
+    calibrate(args.questions, args.vector_store, args.target_recall, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import threading
+from collections import Counter
+from typing import Any, List
+import numpy as np
+from langchain.schema import Document
+from langchain.schema.retriever import BaseRetriever
+from app.quantization import rescore
+
+# Retrieval modes accepted by load_agent
+SEARCH_TYPES = ("adaptive", "similarity", "mmr")
+
+# Adaptive top-k: chunk count bounds, and the cut rules applied between them.
+# The list is cut before a chunk whose similarity drops more than
+# ADAPTIVE_SCORE_GAP below the previous one or below ADAPTIVE_RELATIVE_THRESHOLD
+# times the best, or that would push the context past ADAPTIVE_TOKEN_BUDGET
+ADAPTIVE_MIN_K = 2
+ADAPTIVE_MAX_K = 8
+ADAPTIVE_SCORE_GAP = 0.08
+ADAPTIVE_RELATIVE_THRESHOLD = 0.8
+ADAPTIVE_TOKEN_BUDGET = 1500
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def _docs_for_ids(vectorstore, ids):
+    docs = []
+    for i in ids:
+        docstore_id = vectorstore.index_to_docstore_id[int(i)]
+        doc = vectorstore.docstore.search(docstore_id)
+        if isinstance(doc, Document):
+            docs.append(doc)
+    return docs
+
+
+def mmr_select(query_vector, candidate_vectors, k, lambda_mult=0.5):
+    """
+    Maximal marginal relevance selection
+
+    Candidate-to-candidate similarities are computed once as a single matrix
+    product; each greedy step only updates a running max per candidate.
+
+    Args:
+        query_vector: (d,) query embedding
+        candidate_vectors: (n, d) candidate embeddings
+        k: Number of candidates to select
+        lambda_mult: 1.0 = pure relevance, 0.0 = pure diversity
+
+    Returns:
+        Indices into candidate_vectors, in selection order
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    query = np.asarray(query_vector, dtype=np.float32)
+
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    candidates = candidates / np.maximum(norms, 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    k = min(k, len(candidates))
+    selected = []
+    max_similarity = np.full(len(candidates), -np.inf, dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+
+    for _ in range(k):
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        chosen = int(np.argmax(scores))
+        selected.append(chosen)
+        available[chosen] = False
+        max_similarity = np.maximum(max_similarity, similarity[chosen])
+    return selected
+
+
+def scored_search(vectorstore, query_vector, n, full_vectors=None, rescore_factor=4):
+    """
+    Nearest chunks with their cosine similarity to the query
+
+    Args:
+        vectorstore: FAISS vectorstore
+        query_vector: (d,) query embedding
+        n: Number of results
+        full_vectors: Float32 vectors of a compact index; results are rescored exactly against them
+
+    Returns:
+        (ids, similarities), best first
+    """
+    index = vectorstore.index
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    if full_vectors is not None:
+        _, ids = index.search(query_vector[None, :], min(n * rescore_factor, index.ntotal))
+        ids = [int(i) for i in ids[0] if i != -1]
+        if not ids:
+            return [], np.zeros(0, dtype=np.float32)
+        ids, distances = rescore(query_vector, full_vectors, ids, n)
+    else:
+        distances, ids = index.search(query_vector[None, :], min(n, index.ntotal))
+        found = ids[0] != -1
+        ids, distances = ids[0][found], distances[0][found]
+    # MiniLM embeddings are unit length, so squared L2 distance d maps to cosine 1 - d / 2
+    return [int(i) for i in ids], 1.0 - np.asarray(distances, dtype=np.float32) / 2
+
+
+def adaptive_cut(similarities, token_counts, min_k=ADAPTIVE_MIN_K, max_k=ADAPTIVE_MAX_K,
+                 score_gap=ADAPTIVE_SCORE_GAP, relative_threshold=ADAPTIVE_RELATIVE_THRESHOLD,
+                 token_budget=ADAPTIVE_TOKEN_BUDGET):
+    """
+    Decide how many of the ranked candidates to keep
+
+    Args:
+        similarities: Candidate similarities, best first
+        token_counts: Estimated tokens of each candidate
+
+    Returns:
+        (k, reason) where reason names the rule that ended the list
+    """
+    n = min(len(similarities), max_k)
+    if n <= min_k:
+        return n, "exhausted" if n < max_k else "max_k"
+    tokens = sum(token_counts[:min_k])
+    for i in range(min_k, n):
+        if similarities[i - 1] - similarities[i] > score_gap:
+            return i, "score_gap"
+        if similarities[i] < relative_threshold * similarities[0]:
+            return i, "relative_threshold"
+        if tokens + token_counts[i] > token_budget:
+            return i, "token_budget"
+        tokens += token_counts[i]
+    return n, "max_k" if n == max_k else "exhausted"
+
+
+class RetrievalMetrics:
+    """Chunks and estimated tokens sent to the LLM per adaptive retrieval, and why lists were cut"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.chunks = 0
+        self.tokens = 0
+        self.cut_reasons = Counter()
+
+    def record(self, chunks, tokens, reason):
+        with self._lock:
+            self.queries += 1
+            self.chunks += chunks
+            self.tokens += tokens
+            self.cut_reasons[reason] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queries": self.queries,
+                "avg_chunks": round(self.chunks / self.queries, 2) if self.queries else None,
+                "avg_context_tokens": round(self.tokens / self.queries) if self.queries else None,
+                "cut_reasons": dict(self.cut_reasons)
+            }
+
+
+def get_retrieval_metrics():
+    """Process-wide adaptive retrieval metrics"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = RetrievalMetrics()
+        return _metrics
+
+
+class MMRRetriever(BaseRetriever):
+    """
+    Diversity-aware retriever over a FAISS vectorstore.
+
+    Fetches fetch_k nearest chunks, reconstructs their vectors from the index
+    and picks k of them by maximal marginal relevance, so adjacent
+    overlapping chunks from the same page do not crowd out other clauses.
+    """
+
+    vectorstore: Any
+    k: int = 5
+    fetch_k: int = 20
+    lambda_mult: float = 0.5
+    full_vectors: Any = None
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        index = self.vectorstore.index
+        query_vector = np.asarray(
+            self.vectorstore.embedding_function.embed_query(query), dtype=np.float32
+        )
+
+        _, ids = index.search(query_vector[None, :], min(self.fetch_k, index.ntotal))
+        ids = [int(i) for i in ids[0] if i != -1]
+        if not ids:
+            return []
+
+        if self.full_vectors is not None:
+            candidate_vectors = np.asarray(self.full_vectors[sorted(ids)], dtype=np.float32)
+            ids = sorted(ids)
+        else:
+            candidate_vectors = np.vstack([index.reconstruct(i) for i in ids])
+        selected = mmr_select(query_vector, candidate_vectors, self.k, self.lambda_mult)
+        return _docs_for_ids(self.vectorstore, [ids[i] for i in selected])
+
+
+class RescoringRetriever(BaseRetriever):
+    """
+    Top-k retriever for compact (fp16/int8) indexes.
+
+    Searches the quantized index for k * rescore_factor candidates and
+    re-ranks them by exact distance against memory-mapped float32 vectors.
+    """
+
+    vectorstore: Any
+    full_vectors: Any
+    k: int = 5
+    rescore_factor: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        index = self.vectorstore.index
+        query_vector = np.asarray(
+            self.vectorstore.embedding_function.embed_query(query), dtype=np.float32
+        )
+
+        _, ids = index.search(query_vector[None, :], min(self.k * self.rescore_factor, index.ntotal))
+        ids = [int(i) for i in ids[0] if i != -1]
+        if not ids:
+            return []
+
+        best_ids, _ = rescore(query_vector, self.full_vectors, ids, self.k)
+        return _docs_for_ids(self.vectorstore, best_ids)
+
+
+class AdaptiveRetriever(BaseRetriever):
+    """
+    Top-k retriever whose k follows the score distribution: a sharp question
+    whose best chunk stands out gets min_k chunks, a broad one with many
+    similar matches gets up to max_k, within a context token budget.
+    """
+
+    vectorstore: Any
+    full_vectors: Any = None
+    min_k: int = ADAPTIVE_MIN_K
+    max_k: int = ADAPTIVE_MAX_K
+    score_gap: float = ADAPTIVE_SCORE_GAP
+    relative_threshold: float = ADAPTIVE_RELATIVE_THRESHOLD
+    token_budget: int = ADAPTIVE_TOKEN_BUDGET
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> List[Document]:
+        from app.conversation import estimate_tokens
+
+        query_vector = self.vectorstore.embedding_function.embed_query(query)
+        ids, similarities = scored_search(self.vectorstore, query_vector, self.max_k, self.full_vectors)
+        docs = _docs_for_ids(self.vectorstore, ids)
+        if not docs:
+            return []
+
+        token_counts = [estimate_tokens(doc.page_content) for doc in docs]
+        k, reason = adaptive_cut(
+            similarities[:len(docs)],
+            token_counts,
+            min_k=self.min_k,
+            max_k=self.max_k,
+            score_gap=self.score_gap,
+            relative_threshold=self.relative_threshold,
+            token_budget=self.token_budget
+        )
+        get_retrieval_metrics().record(k, sum(token_counts[:k]), reason)
+        return docs[:k]
+
+
+def build_retriever(db, search_type="adaptive", k=5, fetch_k=20, mmr_lambda=0.5, full_vectors=None,
+                    min_k=ADAPTIVE_MIN_K, max_k=ADAPTIVE_MAX_K):
+    """
+    Create the retriever for a loaded FAISS vectorstore
+
+    Args:
+        db: FAISS vectorstore
+        search_type: 'adaptive', 'similarity' or 'mmr'
+        k: Number of chunks passed to the LLM by 'similarity' and 'mmr'
+        fetch_k: Candidates considered by MMR
+        mmr_lambda: MMR relevance/diversity trade-off
+        full_vectors: Memory-mapped float32 vectors of a compact index; enables exact rescoring
+        min_k: Fewest chunks 'adaptive' passes to the LLM
+        max_k: Most chunks 'adaptive' passes to the LLM
+    """
+    if search_type == "adaptive":
+        if not 1 <= min_k <= max_k:
+            raise ValueError(f"Adaptive retrieval needs 1 <= min_k <= max_k, got {min_k} and {max_k}")
+        return AdaptiveRetriever(vectorstore=db, full_vectors=full_vectors, min_k=min_k, max_k=max_k)
+    if search_type == "similarity":
+        if full_vectors is not None:
+            return RescoringRetriever(vectorstore=db, full_vectors=full_vectors, k=k)
+        return db.as_retriever(search_kwargs={"k": k})
+    if search_type == "mmr":
+        return MMRRetriever(
+            vectorstore=db,
+            k=k,
+            fetch_k=max(fetch_k, k),
+            lambda_mult=mmr_lambda,
+            full_vectors=full_vectors
+        )
+    raise ValueError(f"Unsupported search_type: {search_type}. Use one of {SEARCH_TYPES}")
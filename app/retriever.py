@@ -1,13 +1,54 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
+import json
+import time
+import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from app.embeddings import get_embeddings
+from app.index_store import IndexStore
+from app.upload_store import file_sha256
+from app.extractors import extract_pages
+from app.dedup import deduplicate_chunks
+from app.quantization import compress_index, save_full_vectors, index_bytes_per_vector
+from app.summarizer import start_background_summary_tree
+from app.rules import build_rule_index
+from app.profiling import StageProfiler
 
-def load_pdf_and_create_vectors(pdf_paths, vector_store_path="vectorstore"):
+# Number of chunks embedded per batch, also the granularity of embedding progress
+EMBED_BATCH_SIZE = 64
+
+# Per-build statistics stored in each index version
+INGESTION_REPORT_FILE = "ingestion_report.json"
+
+def load_pdf_and_create_vectors(pdf_paths, vector_store_path="vectorstore", summary_llm=None, progress_callback=None, deduplicate=True, vector_storage="float32"):
     """
     Load multiple PDF files and create a vectorstore with enhanced error handling
+    
+    Args:
+        pdf_paths: Single path or list of PDF paths
+        vector_store_path: Index store root the new version is published to
+        summary_llm: If given, build the hierarchical summary tree with this LLM in the
+            background once the new version is published
+        progress_callback: Optional callable(stage, progress, message) with progress in [0, 1]
+        deduplicate: Collapse exact and near-duplicate chunks (boilerplate) before embedding
+        vector_storage: 'float32' (flat index), or 'fp16'/'int8' scalar-quantized index
+            with a memory-mapped float32 copy for exact rescoring
     """
+    # Per-stage wall time and peak RSS (plus CPU/allocation profiles when profiling is on)
+    profiler = StageProfiler("ingest")
+    try:
+        return _build_index(profiler, pdf_paths, vector_store_path, summary_llm, progress_callback, deduplicate, vector_storage)
+    finally:
+        # Ends the open stage, and with it any CPU sampler and tracemalloc use, however the build exits
+        profiler.finish()
+
+
+def _build_index(profiler, pdf_paths, vector_store_path, summary_llm, progress_callback, deduplicate, vector_storage):
+    def report(stage, progress, message):
+        profiler.stage(stage)
+        if progress_callback is not None:
+            progress_callback(stage, progress, message)
+    
     print(f"🔍 Function called with: {pdf_paths}")
     print(f"🔍 Type: {type(pdf_paths)}")
     print(f"🔍 Current working directory: {os.getcwd()}")
@@ -25,11 +66,27 @@ def load_pdf_and_create_vectors(pdf_paths, vector_store_path="vectorstore"):
 
     print(f"🔍 Normalized paths: {pdf_paths}")
     
+    # Skip files whose content was already seen under another name
+    file_hashes = {}
+    seen_hashes = {}
+    unique_paths = []
+    for pdf_path in pdf_paths:
+        if os.path.exists(pdf_path):
+            content_hash = file_sha256(pdf_path)
+            if content_hash in seen_hashes:
+                print(f"♻️ Skipping {pdf_path}: same content as {seen_hashes[content_hash]}")
+                continue
+            seen_hashes[content_hash] = pdf_path
+            file_hashes[pdf_path] = content_hash
+        unique_paths.append(pdf_path)
+    pdf_paths = unique_paths
+    
     # Load documents from all PDFs
     all_documents = []
     processed_files = []
     
-    for pdf_path in pdf_paths:
+    for file_index, pdf_path in enumerate(pdf_paths):
+        report("extract", 0.4 * file_index / len(pdf_paths), f"Reading {os.path.basename(pdf_path)}")
         print(f"🔍 Processing path: {pdf_path}")
         print(f"🔍 File exists: {os.path.exists(pdf_path)}")
         
@@ -56,53 +113,21 @@ def load_pdf_and_create_vectors(pdf_paths, vector_store_path="vectorstore"):
                     print(f"❌ Cannot read file {pdf_path}: {read_error}")
                     continue
                 
-                # Try to load the PDF with enhanced error handling
-                print(f"🔄 Loading PDF with PyPDFLoader: {pdf_path}")
-                loader = PyPDFLoader(pdf_path)
+                file_hash = file_hashes.get(pdf_path) or file_sha256(pdf_path)
                 
+                # Extract page by page (PyMuPDF first, per-page fallback to pypdf/PyPDF2),
+                # reusing cached page text
+                print(f"🔄 Extracting PDF pages: {pdf_path}")
                 try:
-                    documents = loader.load()
-                    print(f"🔍 PyPDFLoader returned {len(documents)} documents")
+                    documents = extract_pages(pdf_path, file_hash)
+                    print(f"🔍 Extracted {len(documents)} page documents")
                 except Exception as load_error:
-                    print(f"❌ PyPDFLoader failed for {pdf_path}: {load_error}")
-                    
-                    # Try alternative: read as binary and create document manually
-                    try:
-                        print(f"🔄 Attempting manual PDF processing for: {pdf_path}")
-                        import PyPDF2
-                        
-                        with open(pdf_path, 'rb') as file:
-                            pdf_reader = PyPDF2.PdfReader(file)
-                            text_content = ""
-                            
-                            for page_num, page in enumerate(pdf_reader.pages):
-                                try:
-                                    text_content += page.extract_text() + "\n"
-                                except Exception as page_error:
-                                    print(f"⚠️ Error reading page {page_num}: {page_error}")
-                                    continue
-                        
-                        if text_content.strip():
-                            # Create document manually
-                            from langchain.schema import Document
-                            documents = [Document(
-                                page_content=text_content,
-                                metadata={
-                                    'source': pdf_path,
-                                    'source_file': os.path.basename(pdf_path)
-                                }
-                            )]
-                            print(f"✅ Manual PDF processing succeeded for: {pdf_path}")
-                        else:
-                            print(f"❌ No text content extracted from: {pdf_path}")
-                            continue
-                            
-                    except ImportError:
-                        print("❌ PyPDF2 not available for fallback processing")
-                        continue
-                    except Exception as manual_error:
-                        print(f"❌ Manual PDF processing failed for {pdf_path}: {manual_error}")
-                        continue
+                    print(f"❌ PDF extraction failed for {pdf_path}: {load_error}")
+                    continue
+                
+                if not any(doc.page_content.strip() for doc in documents):
+                    print(f"❌ No text content extracted from: {pdf_path}")
+                    continue
                 
                 if not documents:
                     print(f"❌ No documents loaded from: {pdf_path}")
@@ -141,6 +166,7 @@ def load_pdf_and_create_vectors(pdf_paths, vector_store_path="vectorstore"):
         raise ValueError(error_msg)
     
     # Split documents into chunks
+    report("split", 0.4, f"Splitting {len(all_documents)} page(s) into chunks")
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=200
@@ -148,16 +174,84 @@ def load_pdf_and_create_vectors(pdf_paths, vector_store_path="vectorstore"):
     chunks = text_splitter.split_documents(all_documents)
     print(f"🔍 Created {len(chunks)} chunks")
     
+    # Drop repeated boilerplate (disclaimers, headers, definitions) before embedding
+    ingestion_report = {"files": len(processed_files), "pages": len(all_documents)}
+    if deduplicate:
+        report("dedup", 0.43, f"Removing duplicate chunks from {len(chunks)}")
+        chunks, ingestion_report["dedup"] = deduplicate_chunks(chunks)
+    
     # Create embeddings
     print("🔄 Creating embeddings...")
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+    embeddings = get_embeddings()
+    
+    # Embed in batches so progress can be reported while encoding
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = []
+    embed_start = time.perf_counter()
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        report("embed", 0.45 + 0.4 * start / len(texts), f"Embedding chunks {start + 1}-{min(start + EMBED_BATCH_SIZE, len(texts))} of {len(texts)}")
+        vectors.extend(embeddings.embed_documents(texts[start:start + EMBED_BATCH_SIZE]))
+    embed_seconds = time.perf_counter() - embed_start
+    ingestion_report["chunks"] = len(texts)
+    ingestion_report["embed_seconds"] = round(embed_seconds, 2)
     
-    # Create and save vectorstore
+    if "dedup" in ingestion_report and texts:
+        # What the removed chunks would have cost at the measured embedding rate
+        dedup = ingestion_report["dedup"]
+        removed = dedup["input_chunks"] - dedup["output_chunks"]
+        dedup["embed_seconds_saved"] = round(removed * embed_seconds / len(texts), 2)
+        dedup["index_bytes_saved"] = removed * len(vectors[0]) * 4
+        print(f"🧹 Dedup saved ~{dedup['embed_seconds_saved']}s of embedding and "
+              f"{dedup['index_bytes_saved'] / 1024:.0f} KB of vectors "
+              f"({dedup['chars_removed']} of {dedup['chars_total']} characters)")
+    
+    # Write the index into a staging version and publish it atomically,
+    # so sessions loading the index never see a half-written directory
     print("🔄 Creating FAISS vectorstore...")
-    vectorstore = FAISS.from_documents(chunks, embeddings)
-    vectorstore.save_local(vector_store_path)
+    report("save", 0.85, "Writing FAISS index")
+    store = IndexStore(vector_store_path)
+    staged = store.begin_version()
+    try:
+        vectorstore = FAISS.from_embeddings(
+            list(zip(texts, vectors)),
+            embeddings,
+            metadatas=[chunk.metadata for chunk in chunks]
+        )
+        if vector_storage != "float32":
+            full_vectors = np.asarray(vectors, dtype=np.float32)
+            vectorstore.index = compress_index(full_vectors, vector_storage)
+            save_full_vectors(full_vectors, staged.path)
+            ingestion_report["vector_storage"] = vector_storage
+            ingestion_report["index_bytes_per_vector"] = index_bytes_per_vector(vectorstore.index)
+            print(f"🗜️ Stored {vector_storage} index ({ingestion_report['index_bytes_per_vector']} bytes/vector)")
+        vectorstore.save_local(staged.path)
+        
+        # Structured rules (age bands, waiting periods, limits, exclusions) for LLM-free lookups
+        report("rules", 0.87, "Extracting eligibility rules")
+        try:
+            ingestion_report["rules"] = build_rule_index(all_documents, staged.path)
+        except Exception as e:
+            print(f"⚠️ Rule extraction failed, rule questions will use retrieval: {e}")
+        
+        report("publish", 0.97, "Publishing new index version")
+        store.publish(staged)
+    except Exception:
+        store.abort(staged)
+        raise
+    
+    # Page/section/document summaries take one LLM call per page under the Groq
+    # rate limits, so they are built after publishing instead of delaying the index
+    if summary_llm is not None:
+        start_background_summary_tree(all_documents, summary_llm, vector_store_path, staged.version)
+    
+    report("done", 1.0, f"Indexed {len(chunks)} chunks from {len(processed_files)} PDF(s)")
     
+    # Written once every stage, publish included, has closed
+    ingestion_report["stages"] = dict(profiler.finish())
+    report_path = os.path.join(store.version_path(staged.version), INGESTION_REPORT_FILE)
+    tmp_path = f"{report_path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(ingestion_report, f, indent=1)
+    os.replace(tmp_path, report_path)
     print(f"✅ Vectorstore created successfully with {len(chunks)} chunks from {len(processed_files)} PDF(s)")
     return vectorstore
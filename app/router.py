@@ -0,0 +1,268 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# 'auto' routes lookups to the extractive mode; 'llm' sends every question to the LLM
+ANSWER_MODES = ("auto", "llm")
+
+EXTRACTIVE = "extractive"
+GENERATIVE = "generative"
+SUMMARY = "summary"
+
+# Labelled prototype questions; a query takes the label of its most similar prototypes
+ROUTE_PROTOTYPES = {
+    EXTRACTIVE: [
+        "What is the waiting period for critical illness?",
+        "What is the maximum entry age for term insurance?",
+        "What is the minimum sum assured?",
+        "What is the policy term?",
+        "How many days is the free look period?",
+        "What is the grace period for premium payment?",
+        "Is maternity covered?",
+        "Which documents are required for a claim?",
+        "What is the definition of a pre-existing disease?",
+        "What is the premium payment frequency?"
+    ],
+    GENERATIVE: [
+        "Compare the claim conditions for critical illness and accident cover",
+        "Explain how pre-existing disease claims are assessed",
+        "Why would an application be declined?",
+        "How should I advise a 45 year old smoker with diabetes?",
+        "What are the pros and cons of increasing the sum assured?",
+        "Walk me through the underwriting process for a new applicant",
+        "What happens if a customer misses several premium payments?",
+        "Which plan is better for a family with young children?"
+    ],
+    SUMMARY: [
+        "Summarize the underwriting guidelines",
+        "Give me an overview of the document",
+        "What are the key points of this policy?",
+        "Summarize all the exclusions"
+    ]
+}
+
+# Nearest prototypes averaged per label, and how far extractive must lead the other labels
+ROUTER_TOP_N = 3
+ROUTER_MARGIN = 0.05
+
+# Extractive answers: chunks searched, sentences returned, and the minimum
+# query-sentence similarity to answer at all
+EXTRACTIVE_DOCS = 3
+EXTRACTIVE_SENTENCES = 3
+EXTRACTIVE_MIN_SCORE = 0.5
+
+# Latency target for an extractive answer; slower ones are flagged in the router log
+EXTRACTIVE_TARGET_MS = 50
+
+# Chunks whose sentence embeddings are kept in memory, least recently used evicted
+SENTENCE_CACHE_SIZE = 2048
+
+ROUTER_LOG_PATH = os.path.join(".cache", "router_log.jsonl")
+
+_log_lock = threading.Lock()
+_router = None
+_router_lock = threading.Lock()
+
+# chunk content hash -> (sentences, normalized sentence vectors)
+_sentence_cache = OrderedDict()
+_sentence_cache_lock = threading.Lock()
+
+
+def _normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-12)
+
+
+def _sentences(text):
+    for sentence in re.split(r"(?<=[.!?;])\s+|\n+", text):
+        sentence = sentence.strip()
+        # Skip fragments too short to answer anything (headings, page numbers)
+        if len(sentence.split()) >= 4:
+            yield sentence
+
+
+class QueryRouter:
+    """
+    Classifies questions by cosine similarity of their MiniLM embedding to
+    labelled prototype questions. Prototype vectors are computed once per
+    process; routing a query costs one (usually cached) query embedding and
+    a small matrix product.
+    """
+
+    def __init__(self, embeddings, prototypes=ROUTE_PROTOTYPES, top_n=ROUTER_TOP_N, margin=ROUTER_MARGIN):
+        self.embeddings = embeddings
+        self.prototypes = prototypes
+        self.top_n = top_n
+        self.margin = margin
+        self._labels = None
+        self._matrix = None
+        self._lock = threading.Lock()
+        # Running average LLM latency, used to estimate the time saved by extractive answers
+        self.llm_seconds = None
+        self.decisions = {EXTRACTIVE: 0, GENERATIVE: 0, SUMMARY: 0}
+        self.extractive_answers = 0
+        self.seconds_saved = 0.0
+
+    def _prototype_matrix(self):
+        with self._lock:
+            if self._matrix is None:
+                labels, texts = [], []
+                for label, questions in self.prototypes.items():
+                    labels.extend([label] * len(questions))
+                    texts.extend(questions)
+                self._matrix = _normalize_rows(self.embeddings.embed_documents(texts))
+                self._labels = np.asarray(labels)
+            return self._labels, self._matrix
+
+    def classify(self, query_vector):
+        """
+        Returns:
+            (label, scores) with the mean similarity of each label's nearest prototypes
+        """
+        labels, matrix = self._prototype_matrix()
+        similarities = matrix @ _normalize_rows(query_vector)
+        scores = {}
+        for label in self.prototypes:
+            label_scores = np.sort(similarities[labels == label])[::-1][:self.top_n]
+            scores[label] = float(label_scores.mean())
+        label = max(scores, key=scores.get)
+        if label == EXTRACTIVE:
+            runner_up = max(score for other, score in scores.items() if other != EXTRACTIVE)
+            if scores[EXTRACTIVE] - runner_up < self.margin:
+                label = GENERATIVE
+        return label, scores
+
+    def record_llm_latency(self, seconds):
+        self.llm_seconds = seconds if self.llm_seconds is None else 0.8 * self.llm_seconds + 0.2 * seconds
+
+    def log(self, query, label, scores, route, seconds):
+        """Record one routing decision in the router log"""
+        self.decisions[label] += 1
+        saved = None
+        if route == EXTRACTIVE:
+            self.extractive_answers += 1
+            if self.llm_seconds is not None:
+                saved = max(self.llm_seconds - seconds, 0.0)
+                self.seconds_saved += saved
+        entry = {
+            "time": time.time(),
+            "query": query,
+            "label": label,
+            "route": route,
+            "scores": {name: round(score, 3) for name, score in scores.items()},
+            "ms": round(seconds * 1000, 1),
+            "saved_ms": round(saved * 1000, 1) if saved is not None else None
+        }
+        if route == EXTRACTIVE:
+            entry["over_target"] = entry["ms"] > EXTRACTIVE_TARGET_MS
+        print(f"🧭 Routed to {route} ({label}, {entry['ms']} ms"
+              + (f", ~{entry['saved_ms']:.0f} ms saved" if saved is not None else "") + f"): {query}")
+        if entry.get("over_target"):
+            print(f"⚠️ Extractive answer took {entry['ms']} ms, over the {EXTRACTIVE_TARGET_MS} ms target")
+        try:
+            with _log_lock:
+                os.makedirs(os.path.dirname(ROUTER_LOG_PATH), exist_ok=True)
+                with open(ROUTER_LOG_PATH, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not write router log: {e}")
+
+    def stats(self):
+        return {
+            "decisions": dict(self.decisions),
+            "extractive_answers": self.extractive_answers,
+            "avg_llm_ms": round(self.llm_seconds * 1000, 1) if self.llm_seconds is not None else None,
+            "seconds_saved": round(self.seconds_saved, 2)
+        }
+
+
+def get_query_router():
+    """Process-wide router on the shared embedding model"""
+    from app.embeddings import get_embeddings
+
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = QueryRouter(get_embeddings())
+        return _router
+
+
+def _chunk_sentences(embeddings, documents):
+    """
+    (sentences, normalized vectors) of each chunk. Sentence embeddings are
+    cached per chunk content hash, so a chunk is encoded once per process
+    (and across index versions); misses are encoded in one batch.
+    """
+    keys = [hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest() for doc in documents]
+    results = {}
+    with _sentence_cache_lock:
+        for key in keys:
+            if key in _sentence_cache:
+                _sentence_cache.move_to_end(key)
+                results[key] = _sentence_cache[key]
+
+    missing = {}
+    for key, doc in zip(keys, documents):
+        if key not in results and key not in missing:
+            missing[key] = list(dict.fromkeys(_sentences(doc.page_content)))
+    texts = [sentence for sentences in missing.values() for sentence in sentences]
+    vectors = _normalize_rows(embeddings.embed_documents(texts)) if texts else np.zeros((0, 0), dtype=np.float32)
+    offset = 0
+    with _sentence_cache_lock:
+        for key, sentences in missing.items():
+            entry = (sentences, vectors[offset:offset + len(sentences)])
+            offset += len(sentences)
+            results[key] = entry
+            _sentence_cache[key] = entry
+        while len(_sentence_cache) > SENTENCE_CACHE_SIZE:
+            _sentence_cache.popitem(last=False)
+    return [results[key] for key in keys]
+
+
+def extractive_answer(embeddings, query_vector, documents, max_sentences=EXTRACTIVE_SENTENCES, min_score=EXTRACTIVE_MIN_SCORE):
+    """
+    Answer with the retrieved sentences most similar to the question
+
+    Args:
+        embeddings: Embedding model used for the index
+        query_vector: Embedding of the question
+        documents: Retrieved chunks, best first; only the first EXTRACTIVE_DOCS are searched
+        max_sentences: Sentences in the answer
+        min_score: Best sentence similarity required; below it None is returned
+
+    Returns:
+        (answer text, cited documents), or None if no sentence is close enough
+    """
+    candidates = []
+    matrices = []
+    documents = documents[:EXTRACTIVE_DOCS]
+    for doc_index, (sentences, vectors) in enumerate(_chunk_sentences(embeddings, documents)):
+        candidates.extend((doc_index, sentence) for sentence in sentences)
+        if sentences:
+            matrices.append(vectors)
+    if not candidates:
+        return None
+
+    scores = np.vstack(matrices) @ _normalize_rows(query_vector)
+    best = np.argsort(-scores)[:max_sentences]
+    if scores[best[0]] < min_score:
+        return None
+
+    lines, cited = [], []
+    for i in best:
+        if scores[i] < min_score:
+            break
+        doc_index, sentence = candidates[i]
+        doc = documents[doc_index]
+        page = doc.metadata.get("page")
+        source = doc.metadata.get("source_file") or doc.metadata.get("source")
+        citation = f"{source}, page {page + 1}" if isinstance(page, int) else source
+        lines.append(f"- {sentence} ({citation})")
+        if doc not in cited:
+            cited.append(doc)
+    return "\n".join(lines), cited
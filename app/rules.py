@@ -0,0 +1,373 @@
+import os
+import re
+import sqlite3
+import threading
+from langchain.schema import Document
+
+# Structured rule store written next to each index version
+RULES_FILE = "rules.sqlite"
+
+# Rule kinds extracted from the underwriting documents
+AGE_BAND = "age_band"
+WAITING_PERIOD = "waiting_period"
+SUM_ASSURED = "sum_assured"
+EXCLUSION = "exclusion"
+
+# Products and conditions a rule can be attached to, most specific first
+PRODUCT_TERMS = (
+    "critical illness",
+    "pre-existing disease",
+    "personal accident",
+    "term insurance",
+    "term plan",
+    "health insurance",
+    "life insurance",
+    "maternity",
+    "accident",
+    "health",
+    "term",
+    "life"
+)
+
+_PRODUCT_ALIASES = {
+    "term plan": "term insurance",
+    "term": "term insurance",
+    "health": "health insurance",
+    "life": "life insurance",
+    "accident": "personal accident",
+    "pre-existing": "pre-existing disease",
+    "ped": "pre-existing disease"
+}
+
+_UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+_AMOUNT_MULTIPLIERS = {"thousand": 1e3, "lakh": 1e5, "lakhs": 1e5, "million": 1e6, "crore": 1e7, "crores": 1e7}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rules (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    product TEXT,
+    min_value REAL,
+    max_value REAL,
+    unit TEXT,
+    text TEXT NOT NULL,
+    source_file TEXT,
+    page INTEGER
+);
+CREATE INDEX IF NOT EXISTS rules_kind_product ON rules (kind, product);
+"""
+
+# Only entry/issue/eligibility ages; maturity and renewal ages are not entry bands
+_AGE_RANGE = re.compile(
+    r"\b(?:(?:entry|issue|eligibility|eligible)\s+age|age\s+(?:at|of)\s+(?:entry|issue))\b"
+    r"[^.\n]{0,60}?\b(\d{1,3})\s*(?:years?)?\s*(?:to|-|–|and)\s*(\d{1,3})\s*(?:years?)?",
+    re.IGNORECASE
+)
+_AGE_LIMIT = re.compile(
+    r"\b(minimum|maximum|min\.?|max\.?)\s+(?:entry\s+|issue\s+)?age\b(?![^.\n\d]{0,30}\bmaturity\b)[^.\n\d]{0,30}(\d{1,3})",
+    re.IGNORECASE
+)
+_WAITING = re.compile(
+    r"\bwaiting period\b[^.\n\d]{0,60}(\d{1,4})\s*(day|week|month|year)s?",
+    re.IGNORECASE
+)
+_SUM_ASSURED = re.compile(
+    r"\b(minimum|maximum|min\.?|max\.?)?\s*sum (?:assured|insured)\b([^.\n\d]{0,40})"
+    r"(?:rs\.?|inr|₹|\$)?\s*(\d[\d,]*(?:\.\d+)?)\s*(thousand|lakhs?|million|crores?)?(\s*(?:%|x\b|times\b))?",
+    re.IGNORECASE
+)
+_UP_TO = re.compile(r"\b(?:up\s*to|not exceeding|maximum of)\b", re.IGNORECASE)
+_EXCLUSION = re.compile(r"\b(excluded|exclusions?|not covered|not payable)\b", re.IGNORECASE)
+
+_QUESTION_AGE = re.compile(r"\b(\d{1,3})[- ]years?[- ]old\b|\baged?\s+(?:of\s+)?(\d{1,3})\b", re.IGNORECASE)
+
+
+# Short line without figures or a closing full stop: a section or table heading
+_HEADING_MAX_WORDS = 8
+
+
+def _is_heading(line):
+    return (len(line.split()) <= _HEADING_MAX_WORDS and not re.search(r"\d", line)
+            and not line.rstrip().endswith((".", ";")))
+
+
+def _sentences(text):
+    """
+    (sentence, heading) pairs. Table rows come out of extraction as lines,
+    clauses as sentences; heading is the last heading line of the current
+    block, reset at blank lines.
+    """
+    heading = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            heading = None
+            continue
+        if _is_heading(line):
+            heading = line
+        for sentence in re.split(r"(?<=[.;])\s+(?=[A-Z(])", line):
+            sentence = sentence.strip()
+            if sentence:
+                yield sentence, heading
+
+
+def find_product(text):
+    """Canonical product/condition named in text, or None"""
+    lowered = text.lower()
+    for term in PRODUCT_TERMS + tuple(_PRODUCT_ALIASES):
+        if re.search(rf"\b{re.escape(term)}\b", lowered):
+            return _PRODUCT_ALIASES.get(term, term)
+    return None
+
+
+def names_product(text, product):
+    """True if text itself names product (under any alias)"""
+    lowered = text.lower()
+    return any(
+        _PRODUCT_ALIASES.get(term, term) == product and re.search(rf"\b{re.escape(term)}\b", lowered)
+        for term in PRODUCT_TERMS + tuple(_PRODUCT_ALIASES)
+    )
+
+
+def _amount(number, multiplier):
+    value = float(number.replace(",", ""))
+    return value * _AMOUNT_MULTIPLIERS.get((multiplier or "").lower(), 1)
+
+
+def _sentence_rules(sentence, product):
+    rules = []
+    for low, high in _AGE_RANGE.findall(sentence):
+        low, high = int(low), int(high)
+        if 0 <= low < high <= 120:
+            rules.append({"kind": AGE_BAND, "product": product, "min_value": low, "max_value": high, "unit": "years", "text": sentence})
+
+    for bound, age in _AGE_LIMIT.findall(sentence):
+        age = int(age)
+        if age <= 120:
+            is_min = bound.lower().startswith("min")
+            rules.append({
+                "kind": AGE_BAND, "product": product,
+                "min_value": age if is_min else None, "max_value": None if is_min else age,
+                "unit": "years", "text": sentence
+            })
+
+    for amount, unit in _WAITING.findall(sentence):
+        days = int(amount) * _UNIT_DAYS[unit.lower()]
+        label = f"{amount} {unit.lower()}{'' if int(amount) == 1 else 's'}"
+        rules.append({"kind": WAITING_PERIOD, "product": product, "min_value": days, "max_value": days, "unit": label, "text": sentence})
+
+    for bound, between, number, multiplier, relative in _SUM_ASSURED.findall(sentence):
+        # "10 times annual premium" or "110% of premiums" is not an amount
+        if relative:
+            continue
+        value = _amount(number, multiplier)
+        bound = bound.lower()
+        if bound.startswith("max") or _UP_TO.search(between):
+            low, high = None, value
+        elif bound.startswith("min"):
+            low, high = value, None
+        else:
+            # Unqualified amount: a stated sum assured option, neither floor nor ceiling
+            low, high = value, value
+        rules.append({"kind": SUM_ASSURED, "product": product, "min_value": low, "max_value": high, "unit": "amount", "text": sentence})
+
+    if _EXCLUSION.search(sentence):
+        rules.append({"kind": EXCLUSION, "product": product, "min_value": None, "max_value": None, "unit": None, "text": sentence})
+    return rules
+
+
+def extract_rules(text):
+    """
+    Extract rules from one page of text
+
+    Returns:
+        List of dicts with kind, product, min_value, max_value, unit and text
+    """
+    rules = []
+    # Rules belong to the product named in the sentence, else to the product of the
+    # heading above it (table rows); products of earlier sentences are not carried
+    for sentence, heading in _sentences(text):
+        product = find_product(sentence) or (find_product(heading) if heading else None)
+        try:
+            rules.extend(_sentence_rules(sentence, product))
+        except ValueError as e:
+            # A malformed figure loses that sentence's rules, not the page's
+            print(f"⚠️ Skipping rule sentence ({e}): {sentence[:80]}")
+    return rules
+
+
+def build_rule_index(documents, directory):
+    """
+    Extract rules from page documents into <directory>/rules.sqlite
+
+    Returns:
+        Number of rules stored
+    """
+    path = os.path.join(directory, RULES_FILE)
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(_SCHEMA)
+        rows = []
+        for doc in documents:
+            for rule in extract_rules(doc.page_content):
+                rows.append((
+                    rule["kind"], rule["product"], rule["min_value"], rule["max_value"], rule["unit"], rule["text"],
+                    doc.metadata.get("source_file"), doc.metadata.get("page")
+                ))
+        conn.executemany(
+            "INSERT INTO rules (kind, product, min_value, max_value, unit, text, source_file, page) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"📏 Extracted {len(rows)} structured rules")
+    return len(rows)
+
+
+def merge_rule_indexes(directories, directory):
+    """
+    Combine the rule stores of several partial indexes into <directory>/rules.sqlite
+
+    Returns:
+        Number of rules stored
+    """
+    path = os.path.join(directory, RULES_FILE)
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(_SCHEMA)
+        for source in directories:
+            source_path = os.path.join(source, RULES_FILE)
+            if not os.path.exists(source_path):
+                continue
+            conn.execute("ATTACH DATABASE ? AS part", (source_path,))
+            conn.execute(
+                "INSERT INTO rules (kind, product, min_value, max_value, unit, text, source_file, page) "
+                "SELECT kind, product, min_value, max_value, unit, text, source_file, page FROM part.rules ORDER BY id"
+            )
+            conn.commit()
+            conn.execute("DETACH DATABASE part")
+        count = conn.execute("SELECT COUNT(*) FROM rules").fetchone()[0]
+    finally:
+        conn.close()
+    return count
+
+
+def classify_question(question):
+    """
+    (kind, product, value) for a rule lookup question, or None if it is not one
+    """
+    product = find_product(question)
+    lowered = question.lower()
+
+    age = _QUESTION_AGE.search(question)
+    if age and re.search(r"\b(apply|eligible|eligibility|buy|purchase|enrol|enroll|join|qualify|entry|allowed)\b", lowered):
+        return AGE_BAND, product, int(age.group(1) or age.group(2))
+    if "waiting period" in lowered:
+        return WAITING_PERIOD, product, None
+    if re.search(r"\bsum (assured|insured)\b", lowered):
+        return SUM_ASSURED, product, None
+    if re.search(r"\b(exclusions?|excluded|not covered)\b", lowered):
+        return EXCLUSION, product, None
+    return None
+
+
+def _citation(row):
+    page = row["page"]
+    return f"{row['source_file']}, page {page + 1}" if page is not None else row["source_file"]
+
+
+class RuleIndex:
+    """
+    Read-only view of one index version's rule store, answering rule lookup
+    questions directly. Questions without a matching rule return None and
+    go to retrieval + LLM as before.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+
+    def lookup(self, kind, product=None):
+        if product:
+            query, params = "SELECT * FROM rules WHERE kind = ? AND product = ? ORDER BY id", (kind, product)
+        else:
+            query, params = "SELECT * FROM rules WHERE kind = ? ORDER BY id", (kind,)
+        with self._lock:
+            return self._conn.execute(query, params).fetchall()
+
+    def answer(self, question):
+        """
+        Chain-style response dict for a rule lookup question, or None
+
+        Returns:
+            Dict with result, source_documents and rule_match=True
+        """
+        classified = classify_question(question)
+        if classified is None:
+            return None
+        kind, product, value = classified
+        # Rules of other products say nothing about the one asked about
+        if product is None:
+            return None
+        # Only rows whose own text names the product; rows attributed through a
+        # heading can be misattributed and are left to retrieval and the LLM
+        rows = [row for row in self.lookup(kind, product) if names_product(row["text"], product)]
+        if not rows:
+            return None
+
+        if kind == AGE_BAND:
+            lows = {row["min_value"] for row in rows if row["min_value"] is not None}
+            highs = {row["max_value"] for row in rows if row["max_value"] is not None}
+            # Conflicting bands (e.g. per-variant tables) need the LLM to read them in context
+            if len(lows) > 1 or len(highs) > 1:
+                return None
+            low, high = (lows.pop() if lows else None), (highs.pop() if highs else None)
+            eligible = (low is None or value >= low) and (high is None or value <= high)
+            band = f"{int(low) if low is not None else 'any'} to {int(high) if high is not None else 'any'} years"
+            result = (f"{'Yes' if eligible else 'No'}. The entry age for {product} is {band}, "
+                      f"so a {value}-year-old {'can' if eligible else 'cannot'} apply.")
+        elif kind == WAITING_PERIOD:
+            periods = list(dict.fromkeys(row["unit"] for row in rows))
+            if len(periods) > 1:
+                return None
+            result = f"The waiting period for {product} is {periods[0]}."
+        elif kind == SUM_ASSURED:
+            lows = {row["min_value"] for row in rows if row["min_value"] is not None and row["max_value"] is None}
+            highs = {row["max_value"] for row in rows if row["max_value"] is not None and row["min_value"] is None}
+            stated = {row["min_value"] for row in rows if row["min_value"] is not None and row["min_value"] == row["max_value"]}
+            if len(lows) > 1 or len(highs) > 1 or len(stated) > 1:
+                return None
+            parts = []
+            if lows:
+                parts.append(f"minimum sum assured {lows.pop():,.0f}")
+            if highs:
+                parts.append(f"maximum sum assured {highs.pop():,.0f}")
+            if stated:
+                parts.append(f"sum assured {stated.pop():,.0f}")
+            result = f"For {product}: {', '.join(parts)}."
+        else:
+            result = f"Exclusions for {product}:\n" + "\n".join(f"- {row['text']}" for row in rows[:10])
+
+        citations = list(dict.fromkeys(_citation(row) for row in rows))
+        result += f"\n\nSource: {'; '.join(citations[:3])}"
+        return {
+            "result": result,
+            "source_documents": [
+                Document(page_content=row["text"], metadata={
+                    "source_file": row["source_file"], "page": row["page"], "rule_kind": row["kind"]
+                })
+                for row in rows[:10]
+            ],
+            "rule_match": True
+        }
+
+
+def load_rule_index(directory):
+    """RuleIndex of an index version, or None if it has no rule store"""
+    path = os.path.join(directory, RULES_FILE)
+    if not os.path.exists(path):
+        return None
+    return RuleIndex(path)
@@ -0,0 +1,236 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain.schema import Document
+
+SUMMARY_CACHE_DIR = os.path.join(".cache", "summaries")
+SUMMARY_TREE_FILE = "summary_tree.json"
+
+# Pages summarized together into one section summary, and fan-in of each reduce step
+SECTION_SIZE = 10
+
+_SUMMARY_PATTERN = re.compile(
+    r"\b(summar(y|ise|ize|izing)|main points|key points|key findings|overview|tl;?dr|gist)\b",
+    re.IGNORECASE
+)
+
+_PROMPTS = {
+    "page": "Summarize the following page of an insurance document in 3-5 concise bullet points. "
+            "Keep numbers, ages, limits and waiting periods exactly as written.\n\n{text}",
+    "section": "Combine these page summaries from one section of an insurance document into a "
+               "single summary of at most 8 bullet points. Keep key numbers.\n\n{text}",
+    "document": "Combine these section summaries into an overall summary of the document "
+                "'{source}' in at most 10 bullet points.\n\n{text}",
+    "collection": "Combine these per-document summaries into an overview of the whole document "
+                  "collection in at most 10 bullet points, naming the documents.\n\n{text}"
+}
+
+
+def is_summary_question(query):
+    """Return True if the query asks for a summary/overview rather than a specific fact"""
+    return bool(_SUMMARY_PATTERN.search(query or ""))
+
+
+def _llm_text(response):
+    return getattr(response, "content", response)
+
+
+def _model_id(llm):
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+class SummaryCache:
+    """On-disk summary cache keyed by a hash of (level, model, input text)"""
+
+    def __init__(self, cache_dir=SUMMARY_CACHE_DIR):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def summarize(self, llm, level, text, source=""):
+        prompt = _PROMPTS[level].format(text=text, source=source)
+        key = hashlib.sha256(f"{level}\0{_model_id(llm)}\0{prompt}".encode("utf-8")).hexdigest()
+        path = self._path(key)
+
+        if os.path.exists(path):
+            self.hits += 1
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+
+        self.misses += 1
+        summary = _llm_text(llm.invoke(prompt)).strip()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp-{os.getpid()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(summary)
+        os.replace(tmp_path, path)
+        return summary
+
+
+def _reduce(cache, llm, level, summaries, source="", pool=None):
+    """Fold a list of summaries into one, SECTION_SIZE at a time"""
+    while len(summaries) > 1:
+        groups = [summaries[i:i + SECTION_SIZE] for i in range(0, len(summaries), SECTION_SIZE)]
+        texts = ["\n\n".join(group) for group in groups]
+        if pool is not None:
+            summaries = list(pool.map(lambda t: cache.summarize(llm, level, t, source), texts))
+        else:
+            summaries = [cache.summarize(llm, level, t, source) for t in texts]
+    return summaries[0] if summaries else ""
+
+
+def build_summary_tree(documents, llm, vector_store_path="vectorstore", index_version=None,
+                       max_workers=4, cache_dir=SUMMARY_CACHE_DIR):
+    """
+    Build a page -> section -> document -> collection summary tree and store it with the index
+
+    Args:
+        documents: Per-page documents as returned by the PDF loaders
+        llm: LLM used for summarization (a small, cheap model is sufficient)
+        vector_store_path: Index directory the tree is stored in
+        index_version: Version of the index the tree belongs to
+        max_workers: Size of the parallel summarization worker pool
+        cache_dir: Directory of the content-hash summary cache
+    """
+    cache = SummaryCache(cache_dir)
+
+    # Group pages per source file, in page order
+    by_source = {}
+    for doc in documents:
+        if doc.page_content.strip():
+            by_source.setdefault(doc.metadata.get("source_file", "unknown"), []).append(doc)
+    for pages in by_source.values():
+        pages.sort(key=lambda d: d.metadata.get("page", 0))
+
+    tree = {"index_version": index_version, "documents": {}}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Map: every page of every document in one pool
+        page_jobs = {
+            source: [pool.submit(cache.summarize, llm, "page", doc.page_content, source) for doc in pages]
+            for source, pages in by_source.items()
+        }
+
+        for source, jobs in page_jobs.items():
+            page_summaries = [job.result() for job in jobs]
+            pages = by_source[source]
+
+            # Reduce pages into sections
+            sections = []
+            for i in range(0, len(page_summaries), SECTION_SIZE):
+                group = page_summaries[i:i + SECTION_SIZE]
+                sections.append({
+                    "first_page": pages[i].metadata.get("page", i),
+                    "last_page": pages[i + len(group) - 1].metadata.get("page", i + len(group) - 1),
+                    "summary": group[0] if len(group) == 1 else cache.summarize(llm, "section", "\n\n".join(group), source)
+                })
+
+            # Reduce sections into the document summary
+            section_summaries = [section["summary"] for section in sections]
+            if len(section_summaries) > SECTION_SIZE:
+                section_summaries = [_reduce(cache, llm, "section", section_summaries, source, pool)]
+            document_summary = cache.summarize(llm, "document", "\n\n".join(section_summaries), source)
+
+            tree["documents"][source] = {
+                "pages": [
+                    {"page": doc.metadata.get("page", i), "summary": summary}
+                    for i, (doc, summary) in enumerate(zip(pages, page_summaries))
+                ],
+                "sections": sections,
+                "summary": document_summary
+            }
+            print(f"✅ Summarized {source}: {len(pages)} page(s), {len(sections)} section(s)")
+
+    document_summaries = [
+        f"[{source}]\n{entry['summary']}" for source, entry in tree["documents"].items()
+    ]
+    if len(document_summaries) == 1:
+        tree["summary"] = tree["documents"][next(iter(tree["documents"]))]["summary"]
+    elif document_summaries:
+        tree["summary"] = cache.summarize(llm, "collection", "\n\n".join(document_summaries))
+    else:
+        tree["summary"] = ""
+
+    path = os.path.join(vector_store_path, SUMMARY_TREE_FILE)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(tree, f)
+    os.replace(tmp_path, path)
+
+    print(f"✅ Summary tree saved ({cache.hits} cached, {cache.misses} new summaries)")
+    return tree
+
+
+def start_background_summary_tree(documents, llm, vector_store_path, version):
+    """
+    Build the summary tree of a published index version in a daemon thread.
+
+    The version is queryable while its pages are summarized; the tree is
+    written into the version directory when done, where QAAgent picks it up
+    by mtime. A lease keeps the version from being collected meanwhile.
+
+    Returns:
+        The started thread
+    """
+    from app.index_store import IndexStore
+
+    def run():
+        try:
+            with IndexStore(vector_store_path).acquire(version) as lease:
+                # acquire() falls back to the current version if this one was already collected
+                if lease.version != version:
+                    print(f"⚠️ Index version {version} was collected before its summary tree was built")
+                    return
+                build_summary_tree(documents, llm, lease.path, version)
+        except Exception as e:
+            print(f"⚠️ Summary tree build failed, summary questions will use retrieval: {e}")
+
+    thread = threading.Thread(target=run, name="summary-tree", daemon=True)
+    thread.start()
+    print(f"🔄 Building summary tree for index version {version} in the background")
+    return thread
+
+
+def load_summary_tree(vector_store_path="vectorstore", index_version=None):
+    """Load the summary tree stored with the index, or None if missing or stale"""
+    path = os.path.join(vector_store_path, SUMMARY_TREE_FILE)
+    try:
+        with open(path, encoding="utf-8") as f:
+            tree = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index_version is not None and tree.get("index_version") != index_version:
+        return None
+    return tree
+
+
+def answer_from_summary_tree(llm, tree, query):
+    """
+    Answer a summary question with one LLM call over the precomputed tree
+    """
+    parts = [f"Collection overview:\n{tree.get('summary', '')}"]
+    for source, entry in tree["documents"].items():
+        parts.append(f"Document '{source}':\n{entry['summary']}")
+
+    prompt = (
+        "You are an insurance assistant. Using only the document summaries below, "
+        f"answer the request.\n\n{chr(10).join(parts)}\n\nRequest: {query}\nAnswer:"
+    )
+    answer = _llm_text(llm.invoke(prompt)).strip()
+
+    sources = [
+        Document(
+            page_content=entry["summary"],
+            metadata={"source_file": source, "summary_level": "document"}
+        )
+        for source, entry in tree["documents"].items()
+    ]
+    return {"query": query, "result": answer, "source_documents": sources}
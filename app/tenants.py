@@ -0,0 +1,153 @@
+import os
+import re
+import pickle
+import threading
+from collections import OrderedDict
+from langchain_community.vectorstores import FAISS
+from app.embeddings import get_embeddings
+from app.quantization import index_bytes_per_vector
+
+TENANTS_DIR = "tenants"
+DEFAULT_TENANT = "default"
+
+# Memory budget for loaded indexes shared by all tenants in this process
+INDEX_CACHE_BUDGET_MB = int(os.getenv("INDEX_CACHE_BUDGET_MB", "1024"))
+
+# Memory-map index codes instead of reading them, so worker processes can share one copy in the page cache
+INDEX_MMAP = os.getenv("INDEX_MMAP", "0") == "1"
+
+
+def normalize_tenant_id(tenant_id):
+    """Turn a team/workspace name into a safe directory name"""
+    tenant_id = re.sub(r"[^a-z0-9_-]+", "-", (tenant_id or "").strip().lower()).strip("-")
+    return tenant_id or DEFAULT_TENANT
+
+
+def tenant_dir(tenant_id):
+    """Root directory of one tenant's documents and indexes"""
+    return os.path.join(TENANTS_DIR, normalize_tenant_id(tenant_id))
+
+
+def tenant_data_dir(tenant_id):
+    """Directory holding one tenant's uploaded PDFs"""
+    return os.path.join(tenant_dir(tenant_id), "data")
+
+
+def tenant_vector_store_path(tenant_id):
+    """Index store root of one tenant"""
+    return os.path.join(tenant_dir(tenant_id), "vectorstore")
+
+
+def mmap_read_flags():
+    """
+    faiss.read_index flags that memory-map the index codes.
+
+    IO_FLAG_MMAP only maps IVF inverted lists; flat and SQ codes need
+    IO_FLAG_MMAP_IFC (faiss >= 1.8). Older faiss falls back to IO_FLAG_MMAP.
+    """
+    import faiss
+
+    return getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def load_vectorstore(path, mmap=False):
+    """
+    Load a FAISS vectorstore saved with save_local
+
+    Args:
+        path: Index directory
+        mmap: Memory-map index.faiss read-only instead of copying it into process memory
+    """
+    if not mmap:
+        return FAISS.load_local(path, get_embeddings(), allow_dangerous_deserialization=True)
+
+    import faiss
+
+    index = faiss.read_index(os.path.join(path, "index.faiss"), mmap_read_flags())
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(get_embeddings(), index, docstore, index_to_docstore_id)
+
+
+def estimate_index_bytes(db):
+    """
+    Approximate resident size of a loaded FAISS vectorstore. Vector bytes are
+    counted even when memory-mapped: whether faiss actually mapped the codes
+    depends on the index type and faiss version, so the budget assumes a copy.
+    """
+    index = db.index
+    vector_bytes = index.ntotal * index_bytes_per_vector(index)
+    text_bytes = sum(
+        len(doc.page_content) + 200
+        for doc in getattr(db.docstore, "_dict", {}).values()
+    )
+    return vector_bytes + text_bytes
+
+
+class IndexCache:
+    """
+    LRU of loaded FAISS indexes keyed by (index path, version).
+
+    Sessions of the same tenant share one loaded copy. Least recently used
+    indexes are dropped once the total estimated size exceeds the budget;
+    sessions still holding a dropped index keep using it until they reload.
+    """
+
+    def __init__(self, budget_bytes=INDEX_CACHE_BUDGET_MB * 1024 * 1024, mmap=INDEX_MMAP):
+        self.budget_bytes = budget_bytes
+        self.mmap = mmap
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.used_bytes = 0
+
+    def get(self, path, version):
+        """Return the FAISS vectorstore at path, loading it if not cached"""
+        key = (os.path.abspath(path), version)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            # One loader per key; concurrent sessions wait for it
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
+
+            db = load_vectorstore(path, mmap=self.mmap)
+            size = estimate_index_bytes(db)
+
+            with self._lock:
+                self._entries[key] = (db, size)
+                self.used_bytes += size
+                self._loading.pop(key, None)
+                self._evict()
+            print(f"✅ Cached index {key[0]}@{version} ({size / 1024 / 1024:.1f} MB, {self.used_bytes / 1024 / 1024:.1f} MB total)")
+            return db
+
+    def _evict(self):
+        # Always keep the most recently used entry, even if it alone exceeds the budget
+        while self.used_bytes > self.budget_bytes and len(self._entries) > 1:
+            (path, version), (_, size) = self._entries.popitem(last=False)
+            self.used_bytes -= size
+            print(f"🧹 Evicted index {path}@{version} from cache")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "indexes": len(self._entries),
+                "used_mb": round(self.used_bytes / 1024 / 1024, 1),
+                "budget_mb": round(self.budget_bytes / 1024 / 1024, 1),
+                "mmap": self.mmap
+            }
+
+
+_index_cache = IndexCache()
+
+
+def get_index_cache():
+    """Process-wide index cache"""
+    return _index_cache
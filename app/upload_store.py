@@ -0,0 +1,169 @@
+import os
+import json
+import hashlib
+import threading
+from app.index_store import file_lock
+
+# Bytes written (and hashed) per slice of the upload buffer
+WRITE_SLICE_SIZE = 1024 * 1024
+
+_store_lock = threading.Lock()
+
+
+def file_sha256(path, block_size=WRITE_SLICE_SIZE):
+    """Content hash of a file on disk, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class UploadStore:
+    """
+    Content-addressed store for uploaded PDFs.
+
+    Each unique PDF is written once to blobs/<sha256>.pdf. Uploaded names are
+    recorded in names.json and exposed as hard links in data_dir, so the rest
+    of the pipeline keeps working with named paths while identical content
+    uploaded under different names occupies disk space only once.
+    """
+
+    def __init__(self, root, data_dir=None):
+        self.root = root
+        self.blobs_dir = os.path.join(root, "blobs")
+        self.data_dir = data_dir or os.path.join(root, "data")
+        self.names_file = os.path.join(root, "names.json")
+        self.lock_file = os.path.join(root, ".names.lock")
+
+    def _load_names(self):
+        try:
+            with open(self.names_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_names(self, names):
+        tmp_path = f"{self.names_file}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(names, f, indent=1)
+        os.replace(tmp_path, self.names_file)
+
+    def blob_path(self, content_hash):
+        return os.path.join(self.blobs_dir, f"{content_hash}.pdf")
+
+    def _link(self, blob_path, name_path):
+        if os.path.lexists(name_path):
+            os.remove(name_path)
+        try:
+            os.link(blob_path, name_path)
+        except OSError:
+            # Filesystems without hard links: fall back to a symlink
+            os.symlink(os.path.abspath(blob_path), name_path)
+
+    def save(self, name, buffer):
+        """
+        Store an upload, hashing it while it is written
+
+        Args:
+            name: Uploaded file name
+            buffer: bytes-like object (e.g. UploadedFile.getbuffer()); sliced
+                through a memoryview, never copied as a whole
+
+        Returns:
+            Dict with name, path, size, hash and duplicate_of (the first name
+            previously stored with identical content, or None)
+        """
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        view = memoryview(buffer)
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(self.blobs_dir, f".upload-{os.getpid()}-{threading.get_ident()}")
+        with open(tmp_path, "wb") as f:
+            for start in range(0, view.nbytes, WRITE_SLICE_SIZE):
+                chunk = view[start:start + WRITE_SLICE_SIZE]
+                digest.update(chunk)
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        content_hash = digest.hexdigest()
+
+        # names.json is read-modify-written; API worker processes share it
+        with _store_lock, file_lock(self.lock_file):
+            names = self._load_names()
+            blob_path = self.blob_path(content_hash)
+            duplicate_of = None
+            if os.path.exists(blob_path):
+                os.remove(tmp_path)
+                duplicate_of = next(
+                    (other for other, h in sorted(names.items()) if h == content_hash and other != name),
+                    None
+                )
+            else:
+                os.replace(tmp_path, blob_path)
+
+            name_path = os.path.join(self.data_dir, name)
+            self._link(blob_path, name_path)
+            previous_hash = names.get(name)
+            names[name] = content_hash
+            self._save_names(names)
+            if previous_hash and previous_hash != content_hash:
+                self._drop_unreferenced(previous_hash, names)
+
+        if duplicate_of:
+            print(f"♻️ {name} has the same content as {duplicate_of}; stored once")
+        else:
+            print(f"✅ Stored {name} as {content_hash[:12]}")
+
+        return {
+            "name": name,
+            "path": os.path.normpath(name_path),
+            "size": view.nbytes,
+            "hash": content_hash,
+            "duplicate_of": duplicate_of
+        }
+
+    def _drop_unreferenced(self, content_hash, names):
+        if content_hash not in names.values():
+            try:
+                os.remove(self.blob_path(content_hash))
+            except OSError:
+                pass
+
+    def remove(self, name):
+        """Forget an uploaded name; its blob is deleted once no name refers to it"""
+        with _store_lock, file_lock(self.lock_file):
+            names = self._load_names()
+            content_hash = names.pop(name, None)
+            name_path = os.path.join(self.data_dir, name)
+            if os.path.lexists(name_path):
+                os.remove(name_path)
+            self._save_names(names)
+            if content_hash:
+                self._drop_unreferenced(content_hash, names)
+        print(f"Deleted file: {name}")
+
+    def list(self):
+        """Stored uploads as dicts with name, path, size and hash"""
+        records = []
+        for name, content_hash in sorted(self._load_names().items()):
+            blob_path = self.blob_path(content_hash)
+            if os.path.exists(blob_path):
+                records.append({
+                    "name": name,
+                    "path": os.path.normpath(os.path.join(self.data_dir, name)),
+                    "size": os.path.getsize(blob_path),
+                    "hash": content_hash
+                })
+        return records
+
+    def usage(self):
+        """(logical bytes across names, physical bytes across unique blobs)"""
+        records = self.list()
+        logical = sum(record["size"] for record in records)
+        physical = sum(
+            os.path.getsize(self.blob_path(h))
+            for h in {record["hash"] for record in records}
+        )
+        return logical, physical
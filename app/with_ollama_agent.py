@@ -1,14 +1,24 @@
 import os
+import weakref
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
 from langchain_ollama import OllamaLLM
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.chains import RetrievalQA
+from app.index_store import IndexStore
+from app.qa import QAAgent, index_version
+from app.tenants import get_index_cache
+from app.retrieval import ADAPTIVE_MAX_K, ADAPTIVE_MIN_K, build_retriever
+from app.quantization import load_full_vectors
+from app.prompting import build_qa_chain
+from app.router import ANSWER_MODES, get_query_router
+from app.relevance import get_relevance_gate
+from app.llm import get_groq_llm
 
 load_dotenv()
 
-def load_agent(vector_store_path="vectorstore", model_name="llama3-70b-8192", provider="groq", ollama_base_url="http://localhost:11434"):
+# How long Ollama keeps the model loaded after a request, and its fixed context window
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "4096"))
+
+def load_agent(vector_store_path="vectorstore", model_name="llama3-70b-8192", provider="groq", ollama_base_url="http://localhost:11434", search_type="adaptive", fetch_k=20, mmr_lambda=0.5, answer_mode="auto", min_k=ADAPTIVE_MIN_K, max_k=ADAPTIVE_MAX_K):
     """
     Load agent with support for both Groq and Ollama providers
     
@@ -17,48 +27,67 @@ def load_agent(vector_store_path="vectorstore", model_name="llama3-70b-8192", pr
         model_name: Name of the model to use
         provider: Either 'groq' or 'ollama'
         ollama_base_url: Base URL for Ollama (only used if provider is 'ollama')
+        search_type: 'adaptive' (k follows the retrieval scores), 'similarity' (top-k) or 'mmr' (diversity-aware top-k)
+        fetch_k: Candidates considered by MMR
+        mmr_lambda: MMR trade-off, 1.0 = pure relevance, 0.0 = pure diversity
+        answer_mode: 'auto' (lookups answered extractively without the LLM) or 'llm'
+        min_k: Fewest chunks adaptive retrieval sends to the LLM
+        max_k: Most chunks adaptive retrieval sends to the LLM
     """
+    if answer_mode not in ANSWER_MODES:
+        raise ValueError(f"Unsupported answer_mode: {answer_mode}. Use one of {ANSWER_MODES}")
     
-    # Load embeddings and vectorstore
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    db = FAISS.load_local(vector_store_path, embeddings, allow_dangerous_deserialization=True)
-    retriever = db.as_retriever()
-
-    # Initialize LLM based on provider
-    if provider.lower() == "groq":
-        # Groq LLM
-        groq_api_key = os.getenv("GROQ_API_KEY")
-        if not groq_api_key:
-            raise ValueError("GROQ_API_KEY not found in environment variables")
-            
-        llm = ChatGroq(
-            api_key=groq_api_key,
-            model_name=model_name,
-            temperature=0.1
+    # Load vectorstore through the shared index cache
+    lease = IndexStore(vector_store_path).acquire()
+    try:
+        version = lease.version if lease.version != "legacy" else index_version(lease.path)
+        db = get_index_cache().get(lease.path, version)
+        retriever = build_retriever(
+            db,
+            search_type,
+            k=4,
+            fetch_k=fetch_k,
+            mmr_lambda=mmr_lambda,
+            full_vectors=load_full_vectors(lease.path),
+            min_k=min_k,
+            max_k=max_k
         )
-        print(f"✅ Loaded Groq model: {model_name}")
+
+        # Initialize LLM based on provider
+        if provider.lower() == "groq":
+            # Shared Groq client behind the rate limit scheduler
+            llm = get_groq_llm(model_name)
+            print(f"✅ Loaded Groq model: {model_name}")
         
-    elif provider.lower() == "ollama":
-        # Ollama LLM
-        try:
-            llm = OllamaLLM(
-                model=model_name,
-                base_url=ollama_base_url,
-                temperature=0.1
-            )
-            print(f"✅ Loaded Ollama model: {model_name} from {ollama_base_url}")
-        except Exception as e:
-            raise ValueError(f"Failed to connect to Ollama: {str(e)}. Make sure Ollama is running and the model is installed.")
+        elif provider.lower() == "ollama":
+            # Ollama LLM
+            try:
+                # Keep the model (and its cached prompt prefix) loaded between questions;
+                # a fixed context size avoids reloading the model when prompts vary
+                llm = OllamaLLM(
+                    model=model_name,
+                    base_url=ollama_base_url,
+                    temperature=0.1,
+                    keep_alive=OLLAMA_KEEP_ALIVE,
+                    num_ctx=OLLAMA_NUM_CTX
+                )
+                print(f"✅ Loaded Ollama model: {model_name} from {ollama_base_url}")
+            except Exception as e:
+                raise ValueError(f"Failed to connect to Ollama: {str(e)}. Make sure Ollama is running and the model is installed.")
             
-    else:
-        raise ValueError(f"Unsupported provider: {provider}. Use 'groq' or 'ollama'")
+        else:
+            raise ValueError(f"Unsupported provider: {provider}. Use 'groq' or 'ollama'")
 
-    # Create QA chain
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        retriever=retriever,
-        return_source_documents=True,
-        chain_type="stuff"
-    )
+        # Create QA chain with the insurance prompt and a stable prompt prefix
+        qa_chain = build_qa_chain(llm, retriever)
     
-    return qa_chain
+        router = get_query_router() if answer_mode == "auto" else None
+        agent = QAAgent(qa_chain, version, f"{provider.lower()}:{model_name}", lease.path, llm=llm, router=router,
+                        relevance_gate=get_relevance_gate(),
+                        config=(search_type, 4, fetch_k, mmr_lambda, min_k, max_k, answer_mode))
+    except Exception:
+        # Released here, or the version is never collected for the life of the process
+        lease.release()
+        raise
+    weakref.finalize(agent, lease.release)
+    return agent
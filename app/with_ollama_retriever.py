@@ -2,7 +2,8 @@ import os
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from app.embeddings import get_embeddings
+from app.index_store import IndexStore
 
 def load_pdf_and_create_vectors(pdf_paths):
     """
@@ -42,13 +43,18 @@ def load_pdf_and_create_vectors(pdf_paths):
     chunks = text_splitter.split_documents(all_documents)
     
     # Create embeddings
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2"
-    )
+    embeddings = get_embeddings()
     
-    # Create and save vectorstore
+    # Create vectorstore and publish it as a new index version
     vectorstore = FAISS.from_documents(chunks, embeddings)
-    vectorstore.save_local("vectorstore")
+    store = IndexStore("vectorstore")
+    staged = store.begin_version()
+    try:
+        vectorstore.save_local(staged.path)
+        store.publish(staged)
+    except Exception:
+        store.abort(staged)
+        raise
     
     print(f"Vectorstore created successfully with {len(chunks)} chunks from {len(pdf_paths)} PDF(s)")
     return vectorstore
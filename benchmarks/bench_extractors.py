@@ -0,0 +1,85 @@
+"""
+Compare PDF text extraction throughput (pages/s) across backends on a synthetic corpus
+
+Usage:
+    python benchmarks/bench_extractors.py --docs 5 --pages 40
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.extractors import BACKENDS, extract_pages
+from app.extraction_cache import ExtractionCache
+from app.upload_store import file_sha256
+import app.extraction_cache as extraction_cache
+
+WORDS = (
+    "policy insured premium waiting period sum assured exclusion claim rider "
+    "underwriting medical disclosure nominee maturity benefit term critical illness "
+    "pre-existing disease age band smoker tobacco hospitalization deductible"
+).split()
+
+
+def make_corpus(directory, docs, pages, seed=7):
+    """Write synthetic multi-page PDFs with PyMuPDF and return their paths"""
+    import fitz
+    rng = random.Random(seed)
+    paths = []
+    for doc_num in range(docs):
+        pdf = fitz.open()
+        for page_num in range(pages):
+            page = pdf.new_page()
+            lines = [
+                " ".join(rng.choice(WORDS) for _ in range(12))
+                for _ in range(45)
+            ]
+            page.insert_text((40, 50), f"Section {page_num + 1}\n" + "\n".join(lines), fontsize=9)
+        path = os.path.join(directory, f"synthetic_{doc_num}.pdf")
+        pdf.save(path)
+        pdf.close()
+        paths.append(path)
+    return paths
+
+
+def run(paths, backends, use_cache):
+    start = time.perf_counter()
+    pages = 0
+    for path in paths:
+        pages += len(extract_pages(path, file_sha256(path), backends=backends, use_cache=use_cache))
+    elapsed = time.perf_counter() - start
+    return pages, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--docs", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_corpus(tmp, args.docs, args.pages)
+
+        # Keep the benchmark away from the real cache
+        extraction_cache._cache = ExtractionCache(os.path.join(tmp, "extraction.sqlite"))
+
+        print(f"\n{'backend':<28}{'pages':>8}{'seconds':>10}{'pages/s':>10}")
+        rows = [((name,), False) for name in BACKENDS]
+        rows += [(tuple(BACKENDS), True), (tuple(BACKENDS), True)]
+        labels = list(BACKENDS) + ["chain + cache (cold)", "chain + cache (warm)"]
+
+        for label, (backends, use_cache) in zip(labels, rows):
+            try:
+                pages, elapsed = run(paths, backends, use_cache)
+            except Exception as e:
+                print(f"{label:<28}{'error: ' + str(e)}")
+                continue
+            print(f"{label:<28}{pages:>8}{elapsed:>10.2f}{pages / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
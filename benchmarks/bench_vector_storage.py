@@ -0,0 +1,76 @@
+"""
+Recall and memory trade-off of float32 / fp16 / int8 vector storage, with and without exact rescoring
+
+Usage:
+    python benchmarks/bench_vector_storage.py --vectors 100000 --queries 200
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.quantization import compress_index, index_bytes_per_vector, save_full_vectors, load_full_vectors, rescore
+
+DIMENSION = 384  # all-MiniLM-L6-v2
+
+
+def synthetic_embeddings(n, d, clusters=200, seed=7):
+    """Unit-norm clustered vectors, roughly shaped like sentence embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, d)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size=n)] + 0.35 * rng.normal(size=(n, d)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall_at_k(found, truth):
+    return np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+
+
+def main():
+    import faiss
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    data = synthetic_embeddings(args.vectors + args.queries, DIMENSION)
+    vectors, queries = data[:args.vectors], data[args.vectors:]
+
+    exact = faiss.IndexFlatL2(DIMENSION)
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        save_full_vectors(vectors, tmp)
+        full_vectors = load_full_vectors(tmp)
+
+        print(f"\n{'storage':<10}{'MB':>10}{'recall@' + str(args.k):>12}{'ms/query':>10}"
+              f"{'rescored':>12}{'ms/query':>10}")
+        for storage in ("float32", "fp16", "int8"):
+            index = exact if storage == "float32" else compress_index(vectors, storage)
+            megabytes = index.ntotal * index_bytes_per_vector(index) / 1024 / 1024
+
+            start = time.perf_counter()
+            _, found = index.search(queries, args.k)
+            plain_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+            start = time.perf_counter()
+            _, candidates = index.search(queries, args.k * args.rescore_factor)
+            rescored = [rescore(q, full_vectors, c[c != -1], args.k)[0] for q, c in zip(queries, candidates)]
+            rescore_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+            print(f"{storage:<10}{megabytes:>10.1f}{recall_at_k(found, truth):>12.3f}{plain_ms:>10.2f}"
+                  f"{recall_at_k(rescored, truth):>12.3f}{rescore_ms:>10.2f}")
+
+        print(f"\nFull-precision rescoring file: {vectors.nbytes / 1024 / 1024:.1f} MB on disk (memory-mapped)")
+
+
+if __name__ == "__main__":
+    main()
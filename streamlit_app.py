@@ -1,7 +1,23 @@
 import streamlit as st
-from app.retriever import load_pdf_and_create_vectors
 from app.agent import load_agent
+from app.llm import get_groq_llm
+from app.rate_limit import BATCH, scheduler_stats
+from app.index_store import IndexStore
+from app.retrieval import ADAPTIVE_MAX_K, ADAPTIVE_MIN_K, SEARCH_TYPES, get_retrieval_metrics
+from app.router import ANSWER_MODES, get_query_router
+from app.relevance import get_relevance_gate
+from app.embeddings import get_embeddings
+from app.conversation import ConversationMemory
+from app.profiling import profiled, profiling_enabled, set_profiling, recent_profiles
+from app.chat_history import ChatHistory, CHAT_ARCHIVE_DIR, prune_archives
+from app.quantization import VECTOR_STORAGE_OPTIONS
+from app.upload_store import UploadStore
+from app.tenants import DEFAULT_TENANT, normalize_tenant_id, tenant_dir, tenant_data_dir, tenant_vector_store_path, get_index_cache
+from app.precompute import QUICK_QUESTIONS, start_background_precompute
+from app.indexing_jobs import get_indexing_service, QUEUED, RUNNING, SUCCEEDED
 import os
+import time
+import uuid
 import shutil
 
 # Page config
@@ -106,13 +122,29 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Messages rendered per page of the conversation history
+CHAT_PAGE_SIZE = 10
+
 # Initialize session state
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    prune_archives()
+    st.session_state.messages = ChatHistory(os.path.join(CHAT_ARCHIVE_DIR, f"{uuid.uuid4().hex}.jsonl"))
+if "chat_page" not in st.session_state:
+    st.session_state.chat_page = 0
 if "uploaded_pdfs" not in st.session_state:
     st.session_state.uploaded_pdfs = []
 if "vectorstore_created" not in st.session_state:
     st.session_state.vectorstore_created = False
+if "conversation" not in st.session_state:
+    st.session_state.conversation = ConversationMemory()
+
+def workspace_pdf_paths(upload_store):
+    """
+    PDF list of a team workspace, read by the indexing job once it holds the
+    index build lock, so a build queued by another session of the same team
+    cannot publish without this session's uploads
+    """
+    return lambda: [record["path"] for record in upload_store.list()]
 
 # Function to ensure files exist
 def ensure_files_exist():
@@ -134,28 +166,25 @@ def ensure_files_exist():
 def clear_all_pdfs():
     """Function to properly clear all PDFs and cleanup resources"""
     try:
-        # Remove all files from disk
+        # Remove all files from the upload store
         for pdf in st.session_state.uploaded_pdfs:
-            if os.path.exists(pdf['path']):
-                try:
-                    os.remove(pdf['path'])
-                    print(f"Deleted file: {pdf['path']}")
-                except OSError as e:
-                    print(f"Error deleting file {pdf['path']}: {e}")
-        
-        # Remove vectorstore directory if it exists
-        if os.path.exists("vectorstore"):
             try:
-                shutil.rmtree("vectorstore")
-                print("Vectorstore directory removed")
+                UPLOAD_STORE.remove(pdf['name'])
             except OSError as e:
-                print(f"Error removing vectorstore: {e}")
+                print(f"Error deleting file {pdf['path']}: {e}")
+        
+        # Unpublish the index; sessions still reading an old version keep it until they release it
+        try:
+            IndexStore(VECTOR_STORE_PATH).unpublish()
+            print("Vectorstore unpublished")
+        except OSError as e:
+            print(f"Error removing vectorstore: {e}")
         
         # Remove data directory if empty
-        if os.path.exists("data"):
+        if os.path.exists(DATA_DIR):
             try:
-                if not os.listdir("data"):
-                    shutil.rmtree("data")
+                if not os.listdir(DATA_DIR):
+                    shutil.rmtree(DATA_DIR)
                     print("Empty data directory removed")
             except OSError as e:
                 print(f"Error removing data directory: {e}")
@@ -178,13 +207,11 @@ def remove_pdf(index):
         if 0 <= index < len(st.session_state.uploaded_pdfs):
             pdf = st.session_state.uploaded_pdfs[index]
             
-            # Remove file from disk
-            if os.path.exists(pdf['path']):
-                try:
-                    os.remove(pdf['path'])
-                    print(f"Deleted file: {pdf['path']}")
-                except OSError as e:
-                    print(f"Error deleting file {pdf['path']}: {e}")
+            # Remove file from the upload store
+            try:
+                UPLOAD_STORE.remove(pdf['name'])
+            except OSError as e:
+                print(f"Error deleting file {pdf['path']}: {e}")
             
             # Remove from session state
             st.session_state.uploaded_pdfs.pop(index)
@@ -220,6 +247,29 @@ with st.sidebar:
     </div>
     """, unsafe_allow_html=True)
     
+    # Team workspace: each team gets its own documents and index
+    st.markdown("### 👥 Workspace")
+    tenant_input = st.text_input(
+        "Team workspace",
+        value=st.query_params.get("team", DEFAULT_TENANT),
+        help="Documents and the knowledge base are shared within a team and isolated from other teams"
+    )
+    TENANT = normalize_tenant_id(tenant_input)
+    DATA_DIR = tenant_data_dir(TENANT)
+    VECTOR_STORE_PATH = tenant_vector_store_path(TENANT)
+    UPLOAD_STORE = UploadStore(tenant_dir(TENANT), DATA_DIR)
+    
+    if st.session_state.get("tenant") != TENANT:
+        # Switching workspace: show that team's documents, drop this session's agent
+        st.session_state.tenant = TENANT
+        st.session_state.uploaded_pdfs = UPLOAD_STORE.list()
+        st.session_state.vectorstore_created = IndexStore(VECTOR_STORE_PATH).exists()
+        for key in ("agent", "indexing_job"):
+            if key in st.session_state:
+                del st.session_state[key]
+        # The conversation's history and retrieved chunks belong to the previous team
+        st.session_state.conversation.clear()
+    
     # File upload section
     st.markdown("### 📁 Document Management")
     
@@ -235,30 +285,27 @@ with st.sidebar:
         for uploaded_file in uploaded_files:
             if uploaded_file.name not in [pdf['name'] for pdf in st.session_state.uploaded_pdfs]:
                 try:
-                    # Ensure the 'data/' folder exists
-                    os.makedirs("data", exist_ok=True)
-                    
-                    # Save uploaded PDF with explicit flushing
-                    pdf_path = os.path.normpath(os.path.join("data", uploaded_file.name))
-                    with open(pdf_path, "wb") as f:
-                        f.write(uploaded_file.getvalue())
-                        f.flush()  # Force write to disk
-                        os.fsync(f.fileno())  # Ensure OS writes to storage
+                    # Store by content hash, hashing while writing from the upload's
+                    # buffer; identical content under another name is stored once
+                    record = UPLOAD_STORE.save(uploaded_file.name, uploaded_file.getbuffer())
+                    pdf_path = record['path']
                     
                     # Verify file was written correctly
                     if os.path.exists(pdf_path) and os.path.getsize(pdf_path) > 0:
                         st.session_state.uploaded_pdfs.append({
-                            'name': uploaded_file.name,
+                            'name': record['name'],
                             'path': pdf_path,
-                            'size': len(uploaded_file.getvalue())
+                            'size': record['size'],
+                            'hash': record['hash']
                         })
                         print(f"✅ Successfully saved: {pdf_path}")
+                        if record['duplicate_of']:
+                            st.info(f"♻️ {uploaded_file.name} is identical to {record['duplicate_of']} and will not be indexed twice")
                         
-                        # Mark vectorstore as outdated when new files are added
+                        # Mark vectorstore as outdated when new files are added;
+                        # the current agent keeps answering until the rebuild finishes
                         if st.session_state.vectorstore_created:
                             st.session_state.vectorstore_created = False
-                            if "agent" in st.session_state:
-                                del st.session_state.agent
                     else:
                         st.error(f"❌ Failed to save {uploaded_file.name}")
                         
@@ -313,8 +360,40 @@ with st.sidebar:
         help="Select the AI model for processing your queries"
     )
     
+    # Retrieval settings
+    st.markdown("### 🎯 Retrieval")
+    search_type = st.selectbox(
+        "Retrieval mode",
+        SEARCH_TYPES,
+        help="'mmr' skips near-identical overlapping chunks so the answer sees more distinct clauses"
+    )
+    mmr_lambda = 0.5
+    if search_type == "mmr":
+        mmr_lambda = st.slider("Relevance vs diversity", 0.0, 1.0, 0.5, 0.05, help="1.0 = pure relevance, 0.0 = pure diversity")
+    min_k, max_k = ADAPTIVE_MIN_K, ADAPTIVE_MAX_K
+    if search_type == "adaptive":
+        min_k, max_k = st.slider(
+            "Chunks per answer", 1, 12, (ADAPTIVE_MIN_K, ADAPTIVE_MAX_K),
+            help="Sharp questions get the fewest chunks, broad ones up to the most, cut where relevance drops"
+        )
+    answer_mode = st.selectbox(
+        "Answer mode",
+        ANSWER_MODES,
+        help="'auto' answers lookup questions with cited sentences from the documents without calling the LLM"
+    )
+    
     # Load agent button with enhanced validation
     st.markdown("### 🚀 Initialize System")
+    vector_storage = st.selectbox(
+        "Vector storage",
+        VECTOR_STORAGE_OPTIONS,
+        help="fp16/int8 shrink the index 2-4x; results are re-ranked against full-precision vectors on disk"
+    )
+    build_summaries = st.checkbox(
+        "📝 Precompute document summaries",
+        value=True,
+        help="Summarize every page in the background after indexing so summary questions cover whole documents"
+    )
     if st.button("🔄 Process Documents & Load Agent", use_container_width=True):
         if st.session_state.uploaded_pdfs:
             try:
@@ -326,14 +405,6 @@ with st.sidebar:
                     st.session_state.uploaded_pdfs = []  # Clear invalid entries
                     st.rerun()
                 
-                # Create progress bar
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                # Process all PDFs
-                status_text.text("📄 Processing PDF documents...")
-                progress_bar.progress(25)
-                
                 # Get valid PDF paths
                 pdf_paths = [pdf['path'] for pdf in valid_files if os.path.exists(pdf['path'])]
                 
@@ -342,22 +413,13 @@ with st.sidebar:
                 
                 print(f"🔍 Processing {len(pdf_paths)} PDF files: {pdf_paths}")
                 
-                # Create vectorstore with all PDFs
-                load_pdf_and_create_vectors(pdf_paths)
-                st.session_state.vectorstore_created = True
-                progress_bar.progress(60)
-                
-                # Loading agent
-                status_text.text("🤖 Loading AI Agent...")
-                progress_bar.progress(80)
-                st.session_state.agent = load_agent(model_name=model_name)
-                
-                # Complete
-                progress_bar.progress(100)
-                status_text.text("🎉 Ready to assist!")
-                
-                st.balloons()
-                st.success(f"🎉 Agent loaded with {len(pdf_paths)} PDF(s)!")
+                # Build the vectorstore on the background worker from every PDF in the workspace;
+                # the current agent keeps serving
+                summary_llm = get_groq_llm(model_name, max_tokens=400, priority=BATCH) if build_summaries else None
+                st.session_state.indexing_job = get_indexing_service().submit(
+                    workspace_pdf_paths(UPLOAD_STORE), VECTOR_STORE_PATH, summary_llm=summary_llm, vector_storage=vector_storage
+                )
+                st.session_state.indexing_model = model_name
                 
             except Exception as e:
                 st.error(f"❌ Error processing documents: {str(e)}")
@@ -367,8 +429,8 @@ with st.sidebar:
                 st.error("Debug Information:")
                 st.code(f"""
 Current directory: {os.getcwd()}
-Data directory exists: {os.path.exists('data')}
-Data directory contents: {os.listdir('data') if os.path.exists('data') else 'N/A'}
+Data directory exists: {os.path.exists(DATA_DIR)}
+Data directory contents: {os.listdir(DATA_DIR) if os.path.exists(DATA_DIR) else 'N/A'}
 Session PDFs: {len(st.session_state.uploaded_pdfs)}
 Valid files found: {len(ensure_files_exist())}
                 """)
@@ -379,24 +441,66 @@ Valid files found: {len(ensure_files_exist())}
     if st.session_state.vectorstore_created and st.session_state.uploaded_pdfs:
         if st.button("➕ Update Knowledge Base", use_container_width=True, help="Add new PDFs to existing knowledge base"):
             try:
-                with st.spinner("🔄 Updating knowledge base..."):
-                    valid_files = ensure_files_exist()
-                    pdf_paths = [pdf['path'] for pdf in valid_files if os.path.exists(pdf['path'])]
-                    
-                    if not pdf_paths:
-                        raise ValueError("No valid PDF paths found in session state.")
-                    
-                    # Recreate vectorstore with all PDFs
-                    load_pdf_and_create_vectors(pdf_paths)
-                    
-                    # Reload agent with updated vectorstore
-                    st.session_state.agent = load_agent(model_name=model_name)
-                    
-                    st.success("✅ Knowledge base updated successfully!")
-                    
+                valid_files = ensure_files_exist()
+                pdf_paths = [pdf['path'] for pdf in valid_files if os.path.exists(pdf['path'])]
+                
+                if not pdf_paths:
+                    raise ValueError("No valid PDF paths found in session state.")
+                
+                # Recreate vectorstore with all PDFs in the background
+                summary_llm = get_groq_llm(model_name, max_tokens=400, priority=BATCH) if build_summaries else None
+                st.session_state.indexing_job = get_indexing_service().submit(
+                    workspace_pdf_paths(UPLOAD_STORE), VECTOR_STORE_PATH, summary_llm=summary_llm, vector_storage=vector_storage
+                )
+                st.session_state.indexing_model = model_name
+                
             except Exception as e:
                 st.error(f"❌ Error updating knowledge base: {str(e)}")
     
+    # Track the background indexing job
+    indexing_job = None
+    if "indexing_job" in st.session_state:
+        indexing_job = get_indexing_service().status(st.session_state.indexing_job)
+    elif "agent" not in st.session_state:
+        # Reattach to a build started before a browser refresh
+        latest_job = get_indexing_service().latest_job(VECTOR_STORE_PATH)
+        if latest_job and latest_job["state"] in (QUEUED, RUNNING):
+            indexing_job = latest_job
+            st.session_state.indexing_job = latest_job["id"]
+            st.session_state.indexing_model = model_name
+    
+    indexing_in_progress = bool(indexing_job and indexing_job["state"] in (QUEUED, RUNNING))
+    if indexing_in_progress:
+        st.progress(int(indexing_job["progress"] * 100))
+        st.caption(f"📄 {indexing_job['message']}")
+        if "agent" in st.session_state:
+            st.caption("💬 You can keep asking questions against the previous knowledge base.")
+    elif indexing_job and indexing_job["state"] == SUCCEEDED:
+        del st.session_state.indexing_job
+        try:
+            with st.spinner("🤖 Loading AI Agent..."):
+                st.session_state.agent = load_agent(
+                    VECTOR_STORE_PATH,
+                    model_name=st.session_state.indexing_model,
+                    search_type=search_type,
+                    mmr_lambda=mmr_lambda,
+                    answer_mode=answer_mode,
+                    min_k=min_k,
+                    max_k=max_k
+                )
+                st.session_state.vectorstore_created = True
+                
+                # Precompute quick-question answers for this index in the background
+                start_background_precompute(st.session_state.agent)
+            
+            st.balloons()
+            st.success(f"🎉 Agent loaded with {len(indexing_job['pdf_paths'])} PDF(s)!")
+        except Exception as e:
+            st.error(f"❌ Error loading agent: {str(e)}")
+    elif indexing_job:
+        del st.session_state.indexing_job
+        st.error(f"❌ Error processing documents: {indexing_job.get('error')}")
+    
     # System status
     st.markdown("### 📊 System Status")
     if "agent" in st.session_state:
@@ -414,12 +518,44 @@ Valid files found: {len(ensure_files_exist())}
         st.write(f"**Current working directory:** {os.getcwd()}")
         st.write(f"**Files in root:** {os.listdir('.')}")
         
-        if os.path.exists('data'):
-            data_files = os.listdir('data')
+        st.write(f"**Workspace:** {TENANT}")
+        st.write(f"**Index cache:** {get_index_cache().stats()}")
+        if "agent" in st.session_state:
+            st.write(f"**Query embeddings:** {get_embeddings().stats()}")
+            st.write(f"**Query router:** {get_query_router().stats()}")
+            st.write(f"**Adaptive retrieval:** {get_retrieval_metrics().stats()}")
+            st.write(f"**Relevance gate:** {get_relevance_gate().stats()}")
+        st.write(f"**Groq rate limits:** {scheduler_stats()}")
+        
+        # Runtime profiling of ingestion stages and queries
+        profiling = st.checkbox(
+            "⏱️ Profile ingestion and queries",
+            value=profiling_enabled(),
+            help="Samples CPU stacks and traces allocations; adds overhead while enabled"
+        )
+        set_profiling(profiling)
+        for entry in recent_profiles()[:5]:
+            st.write(f"**{entry['name']}/{entry['stage']}:** {entry['seconds']}s, "
+                      f"peak RSS {entry['peak_rss_mb']} MB, {entry.get('samples', 0)} samples")
+            if entry.get("top_stacks"):
+                st.table(entry["top_stacks"])
+            if entry.get("top_allocations"):
+                st.table(entry["top_allocations"])
+            if entry.get("collapsed_stacks") and os.path.exists(entry["collapsed_stacks"]):
+                with open(entry["collapsed_stacks"], "rb") as f:
+                    st.download_button(
+                        "⬇️ Collapsed stacks (flame graph)",
+                        f.read(),
+                        file_name=os.path.basename(entry["collapsed_stacks"]),
+                        key=f"profile_{entry['time']}_{entry['stage']}"
+                    )
+        
+        if os.path.exists(DATA_DIR):
+            data_files = os.listdir(DATA_DIR)
             st.write(f"**Files in data directory:** {data_files}")
             
             for file in data_files:
-                file_path = os.path.join('data', file)
+                file_path = os.path.join(DATA_DIR, file)
                 size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
                 st.write(f"- {file}: {size} bytes")
         else:
@@ -451,16 +587,17 @@ if "agent" in st.session_state:
         # Hidden submit button for form (triggered by Enter)
         form_submitted = st.form_submit_button("Submit", type="primary")
     
+    conversational = st.checkbox(
+        "🧠 Understand follow-up questions",
+        value=True,
+        help="Follow-ups like 'what about for smokers?' are answered in the context of the conversation"
+    )
+    
     # Quick question suggestions
     st.markdown("**💡 Quick Questions:**")
     col1, col2, col3, col4 = st.columns(4)
     
-    quick_questions = [
-        "Summarize the main points",
-        "What are the key findings?", 
-        "List important dates",
-        "Explain the methodology"
-    ]
+    quick_questions = QUICK_QUESTIONS
     
     for i, (col, question) in enumerate(zip([col1, col2, col3, col4], quick_questions)):
         with col:
@@ -469,12 +606,14 @@ if "agent" in st.session_state:
                 with st.spinner("🔄 Searching across all documents..."):
                     try:
                         # Get response from agent
-                        response = st.session_state.agent.invoke({"query": question})
+                        with profiled("query"):
+                            response = st.session_state.agent.invoke({"query": question})
                         answer = response["result"]
                         
                         # Save to chat history
-                        st.session_state.messages.append(("user", question))
-                        st.session_state.messages.append(("bot", answer))
+                        st.session_state.messages.append("user", question)
+                        st.session_state.messages.append("bot", answer)
+                        st.session_state.chat_page = 0
                         
                         # Success notification
                         st.success("✨ Response generated from your document collection!")
@@ -488,12 +627,15 @@ if "agent" in st.session_state:
         with st.spinner("🔄 Searching across all documents..."):
             try:
                 # Get response from agent
-                response = st.session_state.agent.invoke({"query": user_query})
+                memory = st.session_state.conversation if conversational else None
+                with profiled("query"):
+                    response = st.session_state.agent.ask(user_query, memory)
                 answer = response["result"]
                 
                 # Save to chat history
-                st.session_state.messages.append(("user", user_query))
-                st.session_state.messages.append(("bot", answer))
+                st.session_state.messages.append("user", user_query)
+                st.session_state.messages.append("bot", answer)
+                st.session_state.chat_page = 0
                 
                 # Success notification
                 st.success("✨ Response generated from your document collection!")
@@ -505,31 +647,48 @@ if "agent" in st.session_state:
                 st.error(f"❌ Error occurred: {str(e)}")
     
     # Display chat history with enhanced styling
-    if st.session_state.messages:
+    if len(st.session_state.messages):
         st.markdown("### 💭 Conversation History")
         
-        # Create a container for chat messages
-        chat_container = st.container()
+        # Only one page of messages is rendered per rerun; older pages come from the archive
+        page_count = st.session_state.messages.page_count(CHAT_PAGE_SIZE)
+        st.session_state.chat_page = min(st.session_state.chat_page, page_count - 1)
         
-        with chat_container:
-            # Display messages from newest to oldest
-            for i, (role, msg) in enumerate(reversed(st.session_state.messages)):
-                if role == "user":
-                    st.markdown(f"""
-                    <div class="user-message">
-                        <strong>🧑‍💼 You:</strong><br>{msg}
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="bot-message">
-                        <strong>🤖 Assistant:</strong><br>{msg}
-                    </div>
-                    """, unsafe_allow_html=True)
+        # Display messages from newest to oldest as a single HTML block
+        chat_html = []
+        for role, msg in st.session_state.messages.page(st.session_state.chat_page, CHAT_PAGE_SIZE):
+            if role == "user":
+                chat_html.append(f"""
+                <div class="user-message">
+                    <strong>🧑‍💼 You:</strong><br>{msg}
+                </div>
+                """)
+            else:
+                chat_html.append(f"""
+                <div class="bot-message">
+                    <strong>🤖 Assistant:</strong><br>{msg}
+                </div>
+                """)
+        st.markdown("".join(chat_html), unsafe_allow_html=True)
+        
+        if page_count > 1:
+            col_newer, col_page, col_older = st.columns([1, 2, 1])
+            with col_newer:
+                if st.button("⬅️ Newer", disabled=st.session_state.chat_page == 0):
+                    st.session_state.chat_page -= 1
+                    st.rerun()
+            with col_page:
+                st.caption(f"Page {st.session_state.chat_page + 1} of {page_count} ({len(st.session_state.messages)} messages)")
+            with col_older:
+                if st.button("Older ➡️", disabled=st.session_state.chat_page >= page_count - 1):
+                    st.session_state.chat_page += 1
+                    st.rerun()
         
         # Clear chat button
         if st.button("🗑️ Clear Chat History", type="secondary"):
-            st.session_state.messages = []
+            st.session_state.messages.clear()
+            st.session_state.chat_page = 0
+            st.session_state.conversation.clear()
             st.rerun()
     
     else:
@@ -570,3 +729,8 @@ st.markdown("""
     <p>Built with ❤️ using Streamlit | Smart Multi-PDF RAG Assistant v4.0</p>
 </div>
 """, unsafe_allow_html=True)
+
+# Poll the background indexing job until it finishes
+if indexing_in_progress:
+    time.sleep(1)
+    st.rerun()
@@ -1,6 +1,8 @@
 import streamlit as st
 from app.with_ollama_retriever import load_pdf_and_create_vectors
 from app.with_ollama_agent import load_agent
+from app.index_store import IndexStore
+from app.precompute import QUICK_QUESTIONS, start_background_precompute
 import os
 import shutil
 
@@ -139,13 +141,12 @@ def clear_all_pdfs():
                 except OSError as e:
                     print(f"Error deleting file {pdf['path']}: {e}")
         
-        # Remove vectorstore directory if it exists
-        if os.path.exists("vectorstore"):
-            try:
-                shutil.rmtree("vectorstore")
-                print("Vectorstore directory removed")
-            except OSError as e:
-                print(f"Error removing vectorstore: {e}")
+        # Unpublish the index; sessions still reading an old version keep it until they release it
+        try:
+            IndexStore("vectorstore").unpublish()
+            print("Vectorstore unpublished")
+        except OSError as e:
+            print(f"Error removing vectorstore: {e}")
         
         # Remove data directory if empty
         if os.path.exists("data"):
@@ -379,6 +380,9 @@ with st.sidebar:
                         ollama_base_url=ollama_base_url
                     )
                 
+                # Precompute quick-question answers for this index in the background
+                start_background_precompute(st.session_state.agent)
+                
                 # Complete
                 progress_bar.progress(100)
                 status_text.text("🎉 Ready to assist!")
@@ -415,6 +419,7 @@ with st.sidebar:
                             provider="ollama",
                             ollama_base_url=ollama_base_url
                         )
+                    start_background_precompute(st.session_state.agent)
                     
                     st.success("✅ Knowledge base updated successfully!")
                     
@@ -457,12 +462,7 @@ if "agent" in st.session_state:
     st.markdown("**💡 Quick Questions:**")
     col1, col2, col3, col4 = st.columns(4)
     
-    quick_questions = [
-        "Summarize the main points",
-        "What are the key findings?", 
-        "List important dates",
-        "Explain the methodology"
-    ]
+    quick_questions = QUICK_QUESTIONS
     
     for i, (col, question) in enumerate(zip([col1, col2, col3, col4], quick_questions)):
         with col: